@@ -4,48 +4,56 @@ import os
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
-import torch
 from sklearn.metrics import confusion_matrix
 
 
 os.environ["ENV"] = ".env.json"
 
 from ai.neural_network_model import MultimodalModel, MultimodalTrainer
-from ai.data_loader import load_data, split_data, create_dataloader
-from program.constants import Tags, MODEL_SAVE_DIRECTORY, NUMERIC_COLUMNS, TEXT_COLUMNS, SECRETS_DIR
+from ai.data_loader import load_data, create_dataloader
+from program.constants import Tags, MODEL_SAVE_DIRECTORY, SECRETS_DIR, PARQUET_LEDGER_NAME
 
 parser = argparse.ArgumentParser(description="Process some flags.")
 parser.add_argument("-b", "--build", action="store_true", help="Rebuild the model from scratch.")
 parser.add_argument("-p", "--predict", action="store_true", help="Predict the label of the data.")
+parser.add_argument("--parquet", action="store_true", help="Read the parquet ledger instead of budget.csv.")
+parser.add_argument("-e", "--encoder", choices=["bert", "distil", "hashing"], default="bert", help="Text encoder of the descriptions.")
+parser.add_argument("-y", "--years", type=int, default=None, help="Only use transactions since January 1st N years ago.")
 args = parser.parse_args()
 
 
 def main():
     # file_path = os.path.join(os.getcwd(), "private/budget.csv")
-    file_path = f"{SECRETS_DIR}/private/budget.csv"
+    file_path = f"{SECRETS_DIR}/private/{PARQUET_LEDGER_NAME}" if args.parquet else f"{SECRETS_DIR}/private/budget.csv"
+    if args.parquet and not os.path.isdir(file_path):
+        parser.error(f"No parquet ledger at {file_path}, build it from budget.csv with `python main.py --migrate-parquet`.")
     id_to_label = {e.value: e.name for e in Tags}
 
+    text_encoder = args.encoder
+    if args.predict and not args.build:
+        # A saved model predicts from the text encoder it was trained with, whatever --encoder says
+        trainer = MultimodalTrainer.load(MultimodalModel, MODEL_SAVE_DIRECTORY + "/saved_model.pth")
+        text_encoder = trainer.text_encoder
+
     # Load and preprocess data
-    data = load_data(file_path, is_rebuild_bert_embds=True)
-    train_features, test_features, train_labels, test_labels = split_data(data.drop(columns='label'), data['label'])
+    data = load_data(file_path, is_rebuild_bert_embds=True, since_years=args.years, text_encoder=text_encoder)
+    train_data, test_data = data.split()
 
     if args.build:
-        train_data = pd.concat([train_features, train_labels], axis = 1)
-        test_data = pd.concat([test_features, test_labels], axis = 1)
-        train_dataloader = create_dataloader(train_data, NUMERIC_COLUMNS, TEXT_COLUMNS, 'label', batch_size=32)
-        test_dataloader = create_dataloader(test_data, NUMERIC_COLUMNS, TEXT_COLUMNS, 'label', batch_size=32)
-        model = MultimodalModel()
-        trainer = MultimodalTrainer(model=model, train_loader=train_dataloader, test_loader=test_dataloader, num_epochs=100)
+        train_dataloader = create_dataloader(train_data, 'label', batch_size=32)
+        test_dataloader = create_dataloader(test_data, 'label', batch_size=32)
+        model = MultimodalModel(text_input_dim=train_data.embeddings.shape[1])
+        trainer = MultimodalTrainer(
+            model=model, train_loader=train_dataloader, test_loader=test_dataloader, num_epochs=100, text_encoder=args.encoder
+        )
 
         trainer.train()
         trainer.evaluate()
         trainer.save(MODEL_SAVE_DIRECTORY + "/saved_model.pth")
 
         # Get predictions
-        y_true = test_labels.tolist()
-        test_numeric_tensor = torch.tensor(test_data[NUMERIC_COLUMNS].values, dtype=torch.float32)
-        test_text_tensor = torch.tensor(test_data[TEXT_COLUMNS].values, dtype=torch.float32)
-        y_pred = trainer.predict(test_numeric_tensor, test_text_tensor).tolist()
+        y_true = test_data.frame['label'].tolist()
+        y_pred = trainer.predict(*test_data.tensors()).tolist()
 
         # Convert IDs back to label names
         y_true_labels = [id_to_label[y] for y in y_true]
@@ -55,13 +63,10 @@ def main():
         plot_confusion_matrix(y_true_labels, y_pred_labels, list(id_to_label.values()))
 
         # Show mislabeled examples
-        view_mislabeled_samples(test_features, y_true_labels, y_pred_labels)
+        view_mislabeled_samples(test_data.frame, y_true_labels, y_pred_labels)
 
     elif args.predict:
-        trainer = MultimodalTrainer.load(MultimodalModel, MODEL_SAVE_DIRECTORY + "/saved_model.pth")
-        test_numeric_tensor = torch.tensor(test_features[NUMERIC_COLUMNS].values, dtype=torch.float32)
-        test_text_tensor = torch.tensor(test_features[TEXT_COLUMNS].values, dtype=torch.float32)
-        y_pred = trainer.predict(test_numeric_tensor,test_text_tensor).tolist()
+        y_pred = trainer.predict(*test_data.tensors()).tolist()
         y_pred = [id_to_label[y] for y in y_pred]
         print(y_pred[:10])
     else:
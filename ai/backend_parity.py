@@ -0,0 +1,62 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+os.environ["ENV"] = ".env.json"
+
+from ai.bert_embedding_model import BertEmbeddings
+from ai.data_loader import load_labelled_rows
+from ai.neural_network_model import MultimodalModel, MultimodalTrainer
+from ai.text_encoders import TEXT_ENCODERS, HashingEncoder
+from program.constants import MODEL_SAVE_DIRECTORY, NUMERIC_COLUMNS, SECRETS_DIR
+
+parser = argparse.ArgumentParser(description="Compare the accuracy and speed of the inference backends on budget.csv.")
+parser.add_argument("-n", "--rows", type=int, default=2000, help="Number of most recent labelled rows to use.")
+parser.add_argument("--onnx", action="store_true", help="Also export the classifier to ONNX next to the saved model.")
+args = parser.parse_args()
+
+# (embedding backend, classifier backend), the first one is the reference
+BACKENDS = [("eager", "eager"), ("eager", "torchscript"), ("eager", "int8"), ("int8", "int8")]
+
+
+def run(data: pd.DataFrame, embedding_backend: str, model_backend: str, model_path: str) -> dict:
+    """Predict the rows with one pair of backends, timing the embedding and the classification."""
+    trainer = MultimodalTrainer.load(MultimodalModel, model_path, backend=model_backend)
+    model_name = TEXT_ENCODERS[trainer.text_encoder]
+    encoder = BertEmbeddings(model_name, use_compile=False, backend=embedding_backend) if model_name else HashingEncoder()
+
+    start = time.perf_counter()
+    embeddings = encoder.encode(data['description'].tolist())
+    embedding_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = trainer.predict(data[NUMERIC_COLUMNS].to_numpy(np.float32), embeddings).numpy()
+    predict_seconds = time.perf_counter() - start
+    return {"predictions": predictions, "embedding_seconds": embedding_seconds, "predict_seconds": predict_seconds}
+
+
+def main():
+    model_path = MODEL_SAVE_DIRECTORY + "/saved_model.pth"
+    data = load_labelled_rows(f"{SECRETS_DIR}/private/budget.csv", args.rows)
+    labels = data['label'].to_numpy()
+
+    results = {backends: run(data, *backends, model_path) for backends in BACKENDS}
+    reference = results[BACKENDS[0]]
+    print(f"{'embedding':<10} {'classifier':<12} {'accuracy':>8} {'agreement':>9} {'embed s':>8} {'predict s':>9}")
+    for (embedding_backend, model_backend), result in results.items():
+        accuracy = (result["predictions"] == labels).mean()
+        agreement = (result["predictions"] == reference["predictions"]).mean()
+        print(
+            f"{embedding_backend:<10} {model_backend:<12} {accuracy:>8.3f} {agreement:>9.3f} "
+            f"{result['embedding_seconds']:>8.2f} {result['predict_seconds']:>9.3f}"
+        )
+
+    if args.onnx:
+        MultimodalTrainer.load(MultimodalModel, model_path).export_onnx(MODEL_SAVE_DIRECTORY + "/saved_model.onnx")
+
+
+if __name__ == "__main__":
+    main()
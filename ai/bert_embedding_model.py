@@ -1,66 +1,143 @@
-from typing import Union, List
+import json
+import os
+from typing import Union, List, Optional
 
 import numpy as np
 import torch
-from transformers import BertTokenizer, BertModel
+from transformers import AutoTokenizer, AutoModel
 
+from ai.embedding_cache import EmbeddingCache
+from ai.text_encoders import TextEncoder
 
-class BertEmbeddings:
-    def __init__(self, model_name: str = "bert-base-multilingual-cased", max_length: int = 128, use_compile: bool = True):
+
+EMBEDDING_BACKENDS = ["eager", "int8"]
+
+
+class BertEmbeddings(TextEncoder):
+    def __init__(self, model_name: str = "bert-base-multilingual-cased", max_length: int = 128, use_compile: bool = True, backend: str = "eager"):
         """
         Initialize BERT tokenizer and model.
 
-        :param model_name: Name of the BERT model to use.
+        :param model_name: Name of the BERT model to use, any encoder-only transformer such as a distilled BERT works.
         :param max_length: Maximum token length for input text.
+        :param use_compile: Whether to torch.compile the model, ignored by the int8 backend.
+        :param backend: "eager" for fp32, or "int8" for dynamic int8 quantization of the linear layers, on the CPU.
         """
+        assert backend in EMBEDDING_BACKENDS, f"Unknown embedding backend: {backend}"
         self.model_name = model_name # could also use "bert-base-multilingual-cased" or "bert-base-uncased"
         self.max_length = max_length
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.backend = backend
+        # Quantized embeddings differ slightly, they are cached apart from the fp32 ones
+        self.cache_name = model_name if backend == "eager" else f"{model_name}@{backend}"
+        self.device = torch.device("cuda" if torch.cuda.is_available() and backend == "eager" else "cpu")
 
         # Load tokenizer and model
-        self.tokenizer = BertTokenizer.from_pretrained(self.model_name)
-        self.model = BertModel.from_pretrained(self.model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModel.from_pretrained(self.model_name)
         self.model.to(self.device)
         self.model.eval()  # Set model to evaluation mode
+        self.embedding_dim = self.model.config.hidden_size
 
-        if use_compile and hasattr(torch, "compile"):
+        if backend == "int8":
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif use_compile and hasattr(torch, "compile"):
             self.model = torch.compile(self.model)
 
-    def get_bert_embedding(self, text: Union[str, List[str]], pooling: str = "mean") -> np.ndarray:
+    def get_bert_embedding(self, text: Union[str, List[str]], pooling: str = "mean", batch_size: int = 32) -> np.ndarray:
         """
         Get BERT embeddings for a single string or a list of strings.
 
+        Texts are run in mini-batches sorted by token length, so each batch is only padded to its own longest text
+        and peak memory does not grow with the number of texts.
+
         :param text: A single text or a list of texts.
         :param pooling: Pooling strategy for obtaining sentence embeddings.
-        :return: NumPy array of embeddings.
+        :param batch_size: Number of texts per forward pass.
+        :return: NumPy float32 array of embeddings in the order of the input texts.
         """
         if isinstance(text, str):
             text = [text]  # Convert to list if single string
+        if not text:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+
+        # Tokenize once without padding, each batch is padded separately
+        encoded_input = self.tokenizer(text, truncation=True, max_length=self.max_length)
+        order = np.argsort([len(ids) for ids in encoded_input["input_ids"]], kind="stable")
+        embeddings = np.empty((len(text), self.embedding_dim), dtype=np.float32)
+
+        for start in range(0, len(text), batch_size):
+            batch_indices = order[start:start + batch_size]
+            batch = self.tokenizer.pad(
+                {key: [values[i] for i in batch_indices] for key, values in encoded_input.items()},
+                return_tensors="pt",
+            ).to(self.device)
+
+            with torch.no_grad():
+                output = self.model(**batch)
+
+            if pooling == "mean":
+                mask = batch["attention_mask"].unsqueeze(-1).to(output.last_hidden_state.dtype)
+                embedding = (output.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1)  # Average across tokens
+            else:
+                embedding = output.last_hidden_state[:, 0, :]  # CLS token
+            embeddings[batch_indices] = embedding.float().cpu().numpy()
+
+        return embeddings[0] if len(text) == 1 else embeddings  # A single text gives a 1-D embedding
+
+    def encode(self, text: List[str], pooling: str = "cls") -> np.ndarray:
+        """Embeddings of a list of texts, one row per text."""
+        return np.atleast_2d(self.get_bert_embedding(text, pooling))
+
+    def get_cached_embedding(
+        self, text: List[str], cache: Optional[EmbeddingCache] = None, pooling: str = "mean", verbose: bool = True
+    ) -> np.ndarray:
+        """
+        Get BERT embeddings for a list of strings, only texts missing from the cache are run through BERT.
+
+        :param text: A list of texts.
+        :param cache: Embedding cache to read from and write the new embeddings to.
+        :param pooling: Pooling strategy for obtaining sentence embeddings.
+        :param verbose: Whether to print the cache hits and misses.
+        :return: NumPy float32 array of embeddings, one row per text.
+        """
+        if cache is None:
+            return np.asarray(self.get_bert_embedding(text, pooling), dtype=np.float32).reshape(len(text), -1)
+
+        keys = [EmbeddingCache.make_key(self.cache_name, pooling, self.max_length, t) for t in text]
+        found = cache.get_many(list(set(keys)))
+        missing = {key: t for key, t in zip(keys, text) if key not in found}
+        if missing:
+            new_embeddings = self.get_bert_embedding(list(missing.values()), pooling).reshape(len(missing), -1)
+            new_embeddings = dict(zip(missing.keys(), new_embeddings.astype(np.float32)))
+            cache.put_many(new_embeddings)
+            found.update(new_embeddings)
+        if verbose:
+            print(f"Embedding cache: {len(keys) - len(missing)} hits, {len(missing)} misses.")
+        return np.stack([found[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def save_embedding(embeddings: np.ndarray, save_path: str, text: List[str]) -> None:
+        """Save already computed embeddings to a .npy file together with a row-aligned manifest of their texts."""
+        assert len(embeddings) == len(text), "Length mismatch between embeddings and texts."
+        np.save(save_path, embeddings)  # Saves as .npy file
+        with open(get_manifest_path(save_path), "w", encoding="UTF-8") as file:
+            json.dump(text, file, ensure_ascii=False)
+
+    @staticmethod
+    def load_embedding(save_path: str, text: Optional[List[str]] = None) -> np.ndarray:
+        """Load saved BERT embeddings from a file, checking that they belong to the given texts if any."""
+        embeddings = np.load(save_path)
+        if text is not None:
+            try:
+                with open(get_manifest_path(save_path), "r", encoding="UTF-8") as file:
+                    manifest = json.load(file)
+            except FileNotFoundError:
+                manifest = None
+            if manifest != text:
+                raise ValueError(f"Saved embeddings in {save_path} do not match the descriptions, rebuild them.")
+        return embeddings
+
 
-        # Tokenize and move tensors to device
-        encoded_input = self.tokenizer(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            padding=True,
-            max_length=self.max_length
-        ).to(self.device)
-
-        with torch.no_grad():
-            output = self.model(**encoded_input)
-
-        if pooling == "mean":
-            embedding = output.last_hidden_state.mean(dim=1)  # Average across tokens
-        else:
-            embedding = output.last_hidden_state[:, 0, :]  # CLS token
-
-        return embedding.squeeze(0).cpu().numpy()  # Convert to NumPy for easier use
-
-    def save_embedding(self, text: str, save_path: str, pooling: str = "mean"):
-        """Compute and save BERT embeddings to a file."""
-        embedding = self.get_bert_embedding(text, pooling)
-        np.save(save_path, embedding)  # Saves as .npy file
-
-    def load_embedding(self, save_path: str) -> np.ndarray:
-        """Load a saved BERT embedding from a file."""
-        return np.load(save_path)
\ No newline at end of file
+def get_manifest_path(save_path: str) -> str:
+    """Path of the description manifest stored next to an embeddings file."""
+    return f"{os.path.splitext(save_path)[0]}_manifest.json"
@@ -1,10 +1,19 @@
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional, Tuple
+
+import numpy as np
 import pandas as pd
 import torch
 from sklearn.model_selection import train_test_split
 from torch.utils.data import Dataset, DataLoader
 
 from ai.bert_embedding_model import BertEmbeddings
-from program.constants import SECRETS_DIR, Tags
+from ai.embedding_cache import EmbeddingCache
+from ai.model_registry import ModelRegistry
+from program.parquet_ledger import ParquetLedger
+from program.constants import SECRETS_DIR, Tags, EMBEDDING_CACHE_PATH, NUMERIC_COLUMNS
 
 
 class BudgetDataset(Dataset):
@@ -20,19 +29,40 @@ class BudgetDataset(Dataset):
         item['labels'] = torch.tensor(self.labels[idx])
         return item
 
+@dataclass
+class ProcessedData:
+    """Preprocessed rows: a DataFrame for labels and display, the model inputs as contiguous float32 arrays."""
+    frame: pd.DataFrame
+    numeric: np.ndarray
+    embeddings: np.ndarray
+
+    def __len__(self):
+        return len(self.frame)
+
+    def take(self, indices) -> "ProcessedData":
+        """Rows at the given positions."""
+        return ProcessedData(self.frame.iloc[indices].reset_index(drop=True), self.numeric[indices], self.embeddings[indices])
+
+    def tensors(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Numeric and text inputs as tensors sharing memory with the arrays."""
+        return torch.from_numpy(self.numeric), torch.from_numpy(self.embeddings)
+
+    def split(self, test_size=0.2) -> Tuple["ProcessedData", "ProcessedData"]:
+        """Train and test rows, with the same shuffle as split_data."""
+        train_indices, test_indices = train_test_split(np.arange(len(self)), test_size=test_size, random_state=42)
+        return self.take(train_indices), self.take(test_indices)
+
+
 class MultimodalDataset(Dataset):
-    def __init__(self, dataframe: pd.DataFrame, numeric_cols: list, text_cols: list, label_col: str):
+    def __init__(self, data: ProcessedData, label_col: str):
         """
-        Custom PyTorch Dataset for multimodal data.
+        Custom PyTorch Dataset for multimodal data, the feature tensors share memory with the arrays of data.
 
-        :param dataframe: Pandas DataFrame containing the dataset
-        :param numeric_cols: List of column names for numeric features
-        :param text_cols: List of column names for text embeddings (precomputed)
+        :param data: Preprocessed features and text embeddings
         :param label_col: Column name for the target labels
         """
-        self.numeric_data = torch.tensor(dataframe[numeric_cols].values, dtype=torch.float32)
-        self.text_data = torch.tensor(dataframe[text_cols].values, dtype=torch.float32)
-        self.labels = torch.tensor(dataframe[label_col].values, dtype=torch.long)  # Use long for classification
+        self.numeric_data, self.text_data = data.tensors()
+        self.labels = torch.from_numpy(data.frame[label_col].to_numpy(np.int64))  # Use long for classification
 
     def __len__(self):
         return len(self.labels)
@@ -41,34 +71,70 @@ class MultimodalDataset(Dataset):
         return self.numeric_data[idx], self.text_data[idx], self.labels[idx]
 
 
-def load_data(file_path, is_rebuild_bert_embds: bool=False):
-    """Load CSV data and extract year, month, and, day from the date column."""
+def load_data(file_path, is_rebuild_bert_embds: bool=False, since_years: Optional[int] = None, text_encoder: str = "bert"):
+    """Load CSV data, or a parquet ledger directory, and extract year, month, and, day from the date column."""
+    columns = ['date', 'description', 'amount_usd', 'tag']
+    since = date.today().replace(year=date.today().year - since_years, month=1, day=1) if since_years else None
+    if os.path.isdir(file_path):
+        data = ParquetLedger(file_path).read(columns=columns, since=since)
+    else:
+        data = pd.read_csv(file_path, usecols=columns, sep=',', quotechar='"')
+        if since is not None:
+            data = data[pd.to_datetime(data['date']) >= pd.Timestamp(since)].reset_index(drop=True)
+
+    return preprocess_historical_data(data, is_rebuild_bert_embds, True, text_encoder)
+
+
+def add_date_features(data: pd.DataFrame) -> pd.DataFrame:
+    """Add the year, month and day columns of the date column."""
+    dates = pd.to_datetime(data['date'])
+    data['year'] = dates.dt.year.astype('int16')
+    data['month'] = dates.dt.month.astype('int8')
+    data['day'] = dates.dt.day.astype('int8')
+    return data
+
+
+def load_labelled_rows(file_path: str, rows: Optional[int] = None) -> pd.DataFrame:
+    """Most recent rows of budget.csv that have a known tag, with date features and labels but no embeddings."""
     data = pd.read_csv(file_path, usecols=['date', 'description', 'amount_usd', 'tag'], sep=',', quotechar='"')
+    data = data[data['tag'].isin(Tags.__members__)]
+    data = (data.tail(rows) if rows else data).reset_index(drop=True)
+    data['description'] = data['description'].fillna('').astype(str)
+    data['label'] = data['tag'].map({tag.name: tag.value for tag in Tags}).astype('int64')
+    return add_date_features(data)
 
-    return preprocess_historical_data(data, is_rebuild_bert_embds, True)
 
+def preprocess_historical_data(
+    data, is_rebuild_bert_embds: bool = False, is_train: bool = False, text_encoder: str = "bert", verbose: bool = True
+) -> ProcessedData:
+    """Preprocess data by extracting year, month, and day from the date column. Also, fill NaN values in the description column with empty strings.
 
-def preprocess_historical_data(data, is_rebuild_bert_embds: bool = False, is_train: bool = False):
-    """Preprocess data by extracting year, month, and day from the date column. Also, fill NaN values in the description column with empty strings."""
-    print("Preprocessing data...")
-    data['date'] = pd.to_datetime(data['date'])
-    data[['year', 'month', 'day']] = data['date'].apply(lambda x: pd.Series([x.year, x.month, x.day, ]))
-    data['description'] = data['description'].fillna('')
-    try:
-        data['label'] = data['tag'].map(lambda x: Tags[x].value)
-    except KeyError:
+    Progress messages are only printed when verbose.
+    """
+    if verbose:
+        print("Preprocessing data...")
+    add_date_features(data)
+    data['description'] = data['description'].fillna('').astype(str)
+    labels = data['tag'].map({tag.name: tag.value for tag in Tags}) if 'tag' in data else None
+    if labels is not None and labels.notna().all():
+        data['label'] = labels.astype('int64')
+    elif verbose:
         print("No tag column found. Skipping label assignment.")
-    embedder = BertEmbeddings()
+    descriptions = data['description'].tolist()
+    suffix = "" if text_encoder == "bert" else f"_{text_encoder}"
+    embeddings_path = f"{SECRETS_DIR}/private/saved_model/embeddings{suffix}.npy"
     if is_rebuild_bert_embds:
-        embeddings = embedder.get_bert_embedding(data['description'].tolist(), pooling='cls')
+        encoder = ModelRegistry.get_instance().get_encoder(text_encoder)
+        embeddings = encoder.get_cached_embedding(descriptions, EmbeddingCache(EMBEDDING_CACHE_PATH), pooling='cls', verbose=verbose)
         if is_train:
-            embedder.save_embedding(data['description'].tolist(), f"{SECRETS_DIR}/private/saved_model/embeddings.npy", pooling='cls')
+            BertEmbeddings.save_embedding(embeddings, embeddings_path, descriptions)
     else:
-        embeddings = embedder.load_embedding(
-            f"{SECRETS_DIR}/private/saved_model/embeddings.npy")
-    data.drop(columns=['tag', 'date'], inplace=True)
-    print("Data preprocessing complete.")
-    return pd.concat([data, pd.DataFrame(embeddings)], axis=1)
+        embeddings = BertEmbeddings.load_embedding(embeddings_path, descriptions)
+    data = data.drop(columns=['tag', 'date'], errors='ignore').reset_index(drop=True)
+    if verbose:
+        print("Data preprocessing complete.")
+    numeric = np.ascontiguousarray(data[NUMERIC_COLUMNS].to_numpy(np.float32))
+    return ProcessedData(data, numeric, np.ascontiguousarray(np.atleast_2d(np.asarray(embeddings, dtype=np.float32))))
 
 def preprocess_data_old(data, is_prediction_data=False):
     labels, label_to_id = None, None
@@ -104,17 +170,15 @@ def create_dataloaders(train_X, train_y, test_X=None, test_y=None, tokenizer=Non
 
 
 
-def create_dataloader(dataframe: pd.DataFrame, numeric_cols: list, text_cols: list, label_col: str, batch_size=32, shuffle=True):
+def create_dataloader(data: ProcessedData, label_col: str, batch_size=32, shuffle=True):
     """
-    Creates a PyTorch DataLoader from a DataFrame.
+    Creates a PyTorch DataLoader from preprocessed data.
 
-    :param dataframe: Pandas DataFrame containing the dataset
-    :param numeric_cols: List of numeric feature column names
-    :param text_cols: List of text feature column names (embeddings)
+    :param data: Preprocessed features and text embeddings
     :param label_col: Name of the column containing labels
     :param batch_size: Batch size for DataLoader
     :param shuffle: Whether to shuffle the data
     :return: PyTorch DataLoader
     """
-    dataset = MultimodalDataset(dataframe, numeric_cols, text_cols, label_col)
+    dataset = MultimodalDataset(data, label_col)
     return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import sqlite3
+from typing import Dict, List
+
+import numpy as np
+
+SQLITE_MAX_VARIABLES = 900
+
+
+class EmbeddingCache:
+    def __init__(self, cache_path: str):
+        """
+        On-disk cache of text embeddings stored as float32 blobs in sqlite.
+
+        :param cache_path: Path to the sqlite file, created if it does not exist.
+        """
+        self.cache_path = cache_path
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    @staticmethod
+    def make_key(model_name: str, pooling: str, max_length: int, text: str) -> str:
+        """Content address of an embedding, every setting that changes the vector is part of the key."""
+        return hashlib.sha256(f"{model_name}\0{pooling}\0{max_length}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Get the cached embeddings of the given keys, missing keys are left out."""
+        found = {}
+        for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """Store embeddings in a single transaction."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in embeddings.items()],
+            )
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
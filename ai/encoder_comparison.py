@@ -0,0 +1,77 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ["ENV"] = ".env.json"
+
+from ai.data_loader import ProcessedData, create_dataloader, load_labelled_rows
+from ai.model_registry import ModelRegistry
+from ai.neural_network_model import MultimodalModel, MultimodalTrainer
+from ai.text_encoders import TEXT_ENCODERS
+from program.constants import NUMERIC_COLUMNS, SECRETS_DIR
+
+parser = argparse.ArgumentParser(description="Compare the latency, memory and accuracy of the text encoders on budget.csv.")
+parser.add_argument("-n", "--rows", type=int, default=None, help="Only use the N most recent labelled rows.")
+parser.add_argument("--epochs", type=int, default=30, help="Training epochs of the classifier of each encoder.")
+parser.add_argument("-e", "--encoders", nargs="+", choices=list(TEXT_ENCODERS), default=list(TEXT_ENCODERS), help="Encoders to compare.")
+args = parser.parse_args()
+
+
+def get_model_megabytes(encoder) -> float:
+    """Size of the weights of a transformer encoder, encoders without a torch model have none."""
+    model = getattr(encoder, "model", None)
+    if model is None:
+        return 0.0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors) / 2**20
+
+
+def compare(encoder_name: str, data) -> dict:
+    """Load an encoder, embed the rows with it and train and evaluate a classifier on the embeddings."""
+    start = time.perf_counter()
+    encoder = ModelRegistry.get_instance().get_encoder(encoder_name)
+    load_seconds = time.perf_counter() - start
+
+    descriptions = data['description'].tolist()
+    start = time.perf_counter()
+    embeddings = np.ascontiguousarray(encoder.encode(descriptions), dtype=np.float32)
+    encode_seconds = time.perf_counter() - start
+
+    numeric = np.ascontiguousarray(data[NUMERIC_COLUMNS].to_numpy(np.float32))
+    train_data, test_data = ProcessedData(data, numeric, embeddings).split()
+    trainer = MultimodalTrainer(
+        MultimodalModel(text_input_dim=encoder.embedding_dim),
+        num_epochs=args.epochs,
+        train_loader=create_dataloader(train_data, 'label'),
+        test_loader=create_dataloader(test_data, 'label', shuffle=False),
+        text_encoder=encoder_name,
+    )
+    trainer.train()
+    accuracy, _ = trainer.evaluate()
+    ModelRegistry.get_instance().release()
+    return {
+        "dim": encoder.embedding_dim,
+        "load_seconds": load_seconds,
+        "ms_per_1k": 1000 * encode_seconds / max(len(descriptions), 1) * 1000,
+        "model_mb": get_model_megabytes(encoder),
+        "embeddings_mb": embeddings.nbytes / 2**20,
+        "accuracy": accuracy,
+    }
+
+
+def main():
+    data = load_labelled_rows(f"{SECRETS_DIR}/private/budget.csv", args.rows)
+    results = {encoder_name: compare(encoder_name, data) for encoder_name in args.encoders}
+
+    print(f"{'encoder':<8} {'dim':>5} {'load s':>7} {'ms/1k rows':>10} {'model MB':>9} {'embeds MB':>9} {'accuracy':>8}")
+    for encoder_name, result in results.items():
+        print(
+            f"{encoder_name:<8} {result['dim']:>5} {result['load_seconds']:>7.2f} {result['ms_per_1k']:>10.1f} "
+            f"{result['model_mb']:>9.1f} {result['embeddings_mb']:>9.1f} {result['accuracy']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
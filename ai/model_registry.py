@@ -0,0 +1,88 @@
+import gc
+import threading
+from typing import Dict, Optional, Tuple
+
+import torch
+
+from ai.bert_embedding_model import BertEmbeddings
+from ai.neural_network_model import MultimodalTrainer, MultimodalModel
+from ai.text_encoders import TEXT_ENCODERS, HashingEncoder, TextEncoder
+
+
+class ModelRegistry:
+    _instance = None
+
+    def __init__(self):
+        """Process-wide registry that loads each model lazily, once, and shares it between callers."""
+        self._embedders: Dict[Tuple, TextEncoder] = {}
+        self._trainers: Dict[Tuple[type, str, str], MultimodalTrainer] = {}
+        self._lock = threading.Lock()
+        self.backend = "eager"  # Backend of the models loaded without an explicit one
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ModelRegistry()
+        return cls._instance
+
+    def get_embedder(
+        self, model_name: str = "bert-base-multilingual-cased", max_length: int = 128, use_compile: bool = True, backend: Optional[str] = None
+    ) -> BertEmbeddings:
+        """
+        Get the shared BertEmbeddings for these settings, loading it on first use.
+
+        :param model_name: Name of the BERT model to use.
+        :param max_length: Maximum token length for input text.
+        :param use_compile: Whether to torch.compile the model.
+        :param backend: Embedding backend, see BertEmbeddings, the registry backend by default.
+        """
+        backend = backend or self.backend
+        key = (model_name, max_length, use_compile, backend)
+        with self._lock:
+            if key not in self._embedders:
+                self._embedders[key] = BertEmbeddings(model_name, max_length, use_compile, backend)
+            return self._embedders[key]
+
+    def get_encoder(self, name: str = "bert", backend: Optional[str] = None) -> TextEncoder:
+        """
+        Get the shared text encoder of a name of TEXT_ENCODERS, loading it on first use.
+
+        :param name: "bert", "distil" for a distilled multilingual BERT, or "hashing" for hashed character n-grams.
+        :param backend: Embedding backend of the transformer encoders, see BertEmbeddings.
+        """
+        assert name in TEXT_ENCODERS, f"Unknown text encoder: {name}"
+        if TEXT_ENCODERS[name] is None:
+            with self._lock:
+                if (name,) not in self._embedders:
+                    self._embedders[(name,)] = HashingEncoder()
+                return self._embedders[(name,)]
+        return self.get_embedder(TEXT_ENCODERS[name], backend=backend)
+
+    def get_trainer(self, model_path: str, model_class: type = MultimodalModel, backend: Optional[str] = None) -> MultimodalTrainer:
+        """
+        Get the shared MultimodalTrainer of a saved model, loading it on first use.
+
+        :param model_path: Path to the saved model file.
+        :param model_class: Class of the multimodal model to instantiate.
+        :param backend: Inference backend, see MultimodalTrainer.load, the registry backend by default.
+        """
+        backend = backend or self.backend
+        key = (model_class, model_path, backend)
+        with self._lock:
+            if key not in self._trainers:
+                self._trainers[key] = MultimodalTrainer.load(model_class, model_path, backend=backend)
+            return self._trainers[key]
+
+    def warm_up(self, model_path: Optional[str] = None) -> None:
+        """Load the trainer if a model path is given and its text encoder, and run one embedding to trigger compilation."""
+        text_encoder = self.get_trainer(model_path).text_encoder if model_path is not None else "bert"
+        self.get_encoder(text_encoder).encode(["warm up"])
+
+    def release(self) -> None:
+        """Drop all loaded models so their memory can be reclaimed, they are reloaded on the next use."""
+        with self._lock:
+            self._embedders.clear()
+            self._trainers.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
@@ -1,7 +1,8 @@
 # Try a torch Neural Network
 import os
-from typing import Tuple, Optional
+from typing import Iterable, Iterator, Tuple, Optional
 
+import numpy as np
 import pandas as pd
 import torch
 from torch import optim, nn
@@ -20,6 +21,18 @@ import torch
 torch.set_float32_matmul_precision('high')  # Optional for better performance
 torch._dynamo.config.suppress_errors = True  # Disables compiler requirements
 
+INFERENCE_BACKENDS = ["eager", "int8", "torchscript"]
+
+
+def to_tensor(x) -> torch.Tensor:
+    """Float32 tensor of features, float32 NumPy arrays are shared with torch instead of copied."""
+    if isinstance(x, torch.Tensor):
+        return x
+    if isinstance(x, pd.DataFrame):
+        x = x.to_numpy(np.float32)
+    return torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32))
+
+
 class MultimodalModel(nn.Module):
     def __init__(self, numeric_input_dim=N_NUMERICAL_FEATURES, text_input_dim=768, hidden_dim=128, output_dim=N_CLASSES):
         super().__init__()
@@ -66,7 +79,15 @@ class MultimodalModel(nn.Module):
 
 
 class MultimodalTrainer:
-    def __init__(self, model: nn.Module, lr=1e-3, num_epochs=30, train_loader: Optional[DataLoader] = None, test_loader: Optional[DataLoader] = None):
+    def __init__(
+        self,
+        model: nn.Module,
+        lr=1e-3,
+        num_epochs=30,
+        train_loader: Optional[DataLoader] = None,
+        test_loader: Optional[DataLoader] = None,
+        text_encoder: str = "bert",
+    ):
         """
         Wrapper class for training & evaluating the multimodal model.
 
@@ -75,6 +96,7 @@ class MultimodalTrainer:
         :param test_loader: DataLoader for testing data.
         :param lr: Learning rate.
         :param num_epochs: Number of training epochs.
+        :param text_encoder: Name of the text encoder of the text features, saved with the model.
         """
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = model.to(self.device)
@@ -83,6 +105,7 @@ class MultimodalTrainer:
         self.num_epochs = num_epochs
         self.train_loader = train_loader
         self.test_loader = test_loader
+        self.text_encoder = text_encoder
 
     def train(self):
         """ Train the model """
@@ -126,28 +149,35 @@ class MultimodalTrainer:
         print(f"Test Accuracy: {accuracy:.3f}, Test Loss: {avg_loss:.4f}")
         return accuracy, avg_loss
 
-    def predict(self, numeric_x, text_x) -> torch.Tensor:
+    def predict(self, numeric_x, text_x, batch_size: int = 1024) -> torch.Tensor:
         """
         Predict classes for new input data.
 
-        :param numeric_x: Pandas DataFrame or PyTorch Tensor of numeric features
-        :param text_x: Pandas DataFrame or PyTorch Tensor of text features
+        :param numeric_x: PyTorch Tensor, NumPy array or Pandas DataFrame of numeric features
+        :param text_x: PyTorch Tensor, NumPy array or Pandas DataFrame of text features
+        :param batch_size: Rows per forward pass.
         :return: Predicted class labels
         """
-        # Convert DataFrames to PyTorch tensors if needed
-        if isinstance(numeric_x, pd.DataFrame):
-            numeric_x = torch.tensor(numeric_x.values, dtype=torch.float32)
-        if isinstance(text_x, pd.DataFrame):
-            text_x = torch.tensor(text_x.values, dtype=torch.float32)
+        predictions = [batch_predictions for batch_predictions, _ in self.predict_batches([(numeric_x, text_x)], batch_size)]
+        return torch.cat(predictions) if predictions else torch.empty(0, dtype=torch.long)
 
-        numeric_x, text_x = numeric_x.to(self.device), text_x.to(self.device)
+    def predict_batches(self, chunks: Iterable[Tuple], batch_size: int = 1024) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Stream predictions over feature chunks, only one batch is on the device at a time.
 
+        :param chunks: Iterable of (numeric_x, text_x) pairs, as tensors, NumPy arrays or DataFrames.
+        :param batch_size: Rows per forward pass.
+        :return: Generator of (predicted classes, class probabilities) per batch, on the CPU.
+        """
         self.model.eval()
-        with torch.no_grad():
-            outputs = self.model(numeric_x, text_x)
-            predictions = torch.argmax(outputs, dim=1)
-
-        return predictions
+        for numeric_x, text_x in chunks:
+            numeric_x, text_x = to_tensor(numeric_x), to_tensor(text_x)
+            for start in range(0, len(numeric_x), batch_size):
+                # Not held across the yield, so the caller does not run in inference mode
+                with torch.inference_mode():
+                    outputs = self.model(numeric_x[start:start + batch_size].to(self.device), text_x[start:start + batch_size].to(self.device))
+                    probabilities = torch.softmax(outputs, dim=1).cpu()
+                yield torch.argmax(probabilities, dim=1), probabilities
 
     def save(self, save_directory: str):
         """Save model and optimizer state safely."""
@@ -157,37 +187,63 @@ class MultimodalTrainer:
         checkpoint = {
             'model_state_dict': self.model.state_dict(),
             'optimizer_state_dict': self.optimizer.state_dict(),
-            'num_epochs': self.num_epochs
+            'num_epochs': self.num_epochs,
+            'text_encoder': self.text_encoder,
+            'text_input_dim': self.model.text_branch[0].in_features,
         }
 
         torch.save(checkpoint, save_directory)
         print(f"Model saved to {save_directory}")
 
+    def export_onnx(self, save_path: str) -> None:
+        """Export the eager model to ONNX, with a dynamic batch dimension, for inference outside of torch."""
+        model = self.model.eval().cpu()
+        example = (torch.zeros(1, model.numeric_branch[0].in_features), torch.zeros(1, model.text_branch[0].in_features))
+        torch.onnx.export(
+            model,
+            example,
+            save_path,
+            input_names=["numeric", "text"],
+            output_names=["logits"],
+            dynamic_axes={"numeric": {0: "batch"}, "text": {0: "batch"}, "logits": {0: "batch"}},
+        )
+        self.model.to(self.device)
+        print(f"Model exported to {save_path}")
+
     @classmethod
-    def load(cls, model_class: nn.Module, model_path: str, lr=1e-3):
+    def load(cls, model_class: nn.Module, model_path: str, lr=1e-3, backend: str = "eager"):
         """
         Load a trained model and optimizer state.
 
         :param model_class: Class of the multimodal model to instantiate.
         :param model_path: Path to the saved model file.
         :param lr: Learning rate for continued training.
+        :param backend: Inference backend, "eager", "int8" for dynamic quantization on the CPU, or "torchscript"
+            for a frozen TorchScript module. Only the eager backend can be trained further.
         :return: Loaded MultimodalTrainer instance.
         """
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        assert backend in INFERENCE_BACKENDS, f"Unknown inference backend: {backend}"
+        device = torch.device("cuda" if torch.cuda.is_available() and backend != "int8" else "cpu")
+
+        # Load checkpoint, models saved before the text encoder was configurable use BERT
+        checkpoint = torch.load(model_path, map_location=device)
 
         # Instantiate model
-        model = model_class()
+        model = model_class(text_input_dim=checkpoint.get('text_input_dim', 768))
         model.to(device)
-
-        # Load checkpoint
-        checkpoint = torch.load(model_path, map_location=device)
         model.load_state_dict(checkpoint['model_state_dict'])
 
         # Initialize Trainer instance
-        trainer = cls(model, lr, num_epochs=checkpoint['num_epochs'])
+        trainer = cls(model, lr, num_epochs=checkpoint['num_epochs'], text_encoder=checkpoint.get('text_encoder', 'bert'))
 
         # Load optimizer state
         trainer.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
 
+        if backend == "int8":
+            trainer.device = torch.device("cpu")  # Quantized kernels only run on the CPU
+            trainer.model = torch.quantization.quantize_dynamic(model.cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+        elif backend == "torchscript":
+            trainer.model = torch.jit.freeze(torch.jit.script(model.eval()))
+
         print(f"Model loaded from {model_path}")
         return trainer
\ No newline at end of file
@@ -0,0 +1,52 @@
+from typing import List, Optional
+
+import numpy as np
+
+from ai.embedding_cache import EmbeddingCache
+
+# Encoder names accepted by ModelRegistry.get_encoder, with the transformer model they load if any
+TEXT_ENCODERS = {
+    "bert": "bert-base-multilingual-cased",
+    "distil": "distilbert-base-multilingual-cased",
+    "hashing": None,
+}
+
+
+class TextEncoder:
+    """Interface of the encoders turning descriptions into fixed-size float32 vectors for MultimodalModel."""
+
+    embedding_dim: int
+
+    def encode(self, text: List[str]) -> np.ndarray:
+        """
+        Encode texts.
+
+        :param text: A list of texts.
+        :return: NumPy float32 array of shape (len(text), embedding_dim).
+        """
+        raise NotImplementedError
+
+    def get_cached_embedding(
+        self, text: List[str], cache: Optional[EmbeddingCache] = None, pooling: str = "mean", verbose: bool = True
+    ) -> np.ndarray:
+        """Encode texts, encoders that are cheaper than a cache lookup ignore the cache, pooling and verbose."""
+        return self.encode(text)
+
+
+class HashingEncoder(TextEncoder):
+    def __init__(self, n_features: int = 512, ngram_range: tuple = (2, 4)):
+        """
+        Hashed character n-gram encoder, it has no weights to load and encodes on the CPU in microseconds per text.
+
+        :param n_features: Number of hash buckets, the embedding dimension.
+        :param ngram_range: Smallest and largest character n-gram length, n-grams do not cross words.
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.embedding_dim = n_features
+        self.vectorizer = HashingVectorizer(
+            analyzer="char_wb", ngram_range=ngram_range, n_features=n_features, alternate_sign=False, lowercase=True, norm="l2"
+        )
+
+    def encode(self, text: List[str]) -> np.ndarray:
+        return self.vectorizer.transform(text).toarray().astype(np.float32)
@@ -0,0 +1,59 @@
+"""Compare the memory footprint of Transaction with the previous dict-backed dataclass.
+
+Run from the repository root with `python -m benchmarks.transaction_memory`.
+"""
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from program.constants import Account, Tags
+from program.transaction_class import Transaction
+
+N_TRANSACTIONS = 100_000
+
+
+@dataclass
+class DictTransaction:
+    """Transaction as it was before __slots__ and interning."""
+    account: Account
+    account_id: int
+    account_currency: str
+    amount_account_currency: float
+    amount_usd: float
+    bank_name: str
+    date: datetime
+    description: str
+    origin_file_name: str
+    tag: Optional[Tags] = None
+    fingerprint: Optional[str] = None
+
+
+def measure(transaction_class: type) -> float:
+    """Bytes allocated per transaction, with low-cardinality strings built per row as a csv parser does."""
+    tracemalloc.start()
+    transactions = [
+        transaction_class(
+            account=Account.CHECKING,
+            account_id=1,
+            account_currency="".join(["C", "Z", "K"]),
+            amount_account_currency=-float(n % 1000),
+            amount_usd=-float(n % 1000) / 22.5,
+            bank_name="".join(["Test ", "Bank"]),
+            date=datetime(2024, 1 + n % 12, 1 + n % 28),
+            description=f"shop {n % 500}",
+            origin_file_name="".join(["2024-01-01_", "Checking.csv"]),
+            tag=Tags.food,
+        )
+        for n in range(N_TRANSACTIONS)
+    ]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del transactions
+    return size / N_TRANSACTIONS
+
+
+if __name__ == "__main__":
+    before, after = measure(DictTransaction), measure(Transaction)
+    print(f"dict dataclass:    {before:7.1f} bytes per transaction")
+    print(f"slotted, interned: {after:7.1f} bytes per transaction ({1 - after / before:.0%} less)")
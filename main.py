@@ -1,7 +1,12 @@
+import argparse
 import os
 
 from program.collection_class import Collection
-from program.constants import SECRETS_DIR
+from program.constants import SECRETS_DIR, MODEL_SAVE_DIRECTORY, TRANSACTION_STORE_NAME, PARQUET_LEDGER_NAME
+from program.helper_functions import print_info_message, print_warning_message
+from program.merchant_table import MerchantTable
+from program.parquet_ledger import ParquetLedger
+from program.transaction_store import TransactionStore
 
 os.environ["ENV"] = ".env.json"
 
@@ -14,15 +19,54 @@ from program.utils import (
 signal.signal(signal.SIGINT, signal_handler)
 
 
-def main():
+parser = argparse.ArgumentParser(description="Import, tag and review statements.")
+parser.add_argument("--pipeline", action="store_true", help="Review transactions while later ones are still being tagged.")
+parser.add_argument("--int8", action="store_true", help="Run BERT and the classifier with dynamic int8 quantization.")
+parser.add_argument("--chunk-size", type=int, default=128, help="Transactions tagged per chunk in pipeline mode.")
+parser.add_argument(
+    "--ledger", choices=["csv", "parquet", "both"], default="csv", help="Ledger to write, budget.csv, the parquet ledger or both."
+)
+parser.add_argument("--migrate-parquet", action="store_true", help="Build the parquet ledger from budget.csv and exit.")
+
+
+def migrate_parquet_ledger(working_directory: str) -> None:
+    """Build the parquet ledger from budget.csv, an existing parquet ledger is left untouched."""
+    parquet_path = f"{working_directory}/{PARQUET_LEDGER_NAME}"
+    if os.path.isdir(parquet_path):
+        print_warning_message(f"{parquet_path} already exists, remove it to rebuild it from budget.csv.")
+        return
+    ParquetLedger.from_csv(f"{working_directory}/budget.csv", parquet_path)
+    print_info_message(f"Parquet ledger written to {parquet_path}.")
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
     # for testing
     # working_directory = "./data/examples/"
-    collection = Collection()
     working_directory = f"{SECRETS_DIR}/private/"
-    collection.import_data(working_directory)
-    collection.format_and_tag_data()
-    collection.review_data()
-    collection.insert_data_to_file(working_directory)
+    if args.migrate_parquet:
+        migrate_parquet_ledger(working_directory)
+        return
+    collection = Collection(
+        transaction_store=TransactionStore(f"{working_directory}/{TRANSACTION_STORE_NAME}"),
+        merchant_table=MerchantTable.from_ledger(f"{working_directory}/budget.csv"),
+    )
+    collection.import_data(working_directory, incremental=True)
+    if len(collection.transactions):
+        from ai.model_registry import ModelRegistry  # Imports the ML stack, only when there is something to tag
+
+        models = ModelRegistry.get_instance()
+        models.backend = "int8" if args.int8 else "eager"
+        models.warm_up(MODEL_SAVE_DIRECTORY + "/saved_model.pth")
+        if args.pipeline:
+            collection.format_and_review_pipelined(args.chunk_size)
+        else:
+            collection.format_and_tag_data()
+            collection.review_data()
+    else:
+        print_info_message("No new transactions to import.")
+    collection.insert_data_to_file(working_directory, args.ledger)
+    print_info_message(collection.merchant_table.report())
 
 
 
@@ -1,24 +1,38 @@
-import csv
+import queue
+import threading
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional, Union, TYPE_CHECKING
 
-import pandas as pd
-from sympy.printing.pytorch import torch
-
-from ai.bert_embedding_model import BertEmbeddings
-from ai.data_loader import preprocess_historical_data
-from ai.neural_network_model import MultimodalTrainer, MultimodalModel
-from program.constants import CONFIG, Tags, NUMERIC_COLUMNS, TEXT_COLUMNS, MODEL_SAVE_DIRECTORY, SECRETS_DIR
-from program.helper_functions import print_warning_message, check_description, get_tag
+from program.constants import Tags, TagSource, MODEL_SAVE_DIRECTORY, PARQUET_LEDGER_NAME, get_auto_accept_threshold
+from program.helper_functions import print_warning_message, print_info_message, check_description, get_tag
+from program.import_manifest import ImportManifest
+from program.ledger_index import LedgerIndex, record_fingerprints
+from program.merchant_table import MerchantTable
+from program.parquet_ledger import LEDGER_COLUMNS, ParquetLedger
 from program.transaction_class import Transaction
-from program.utils import get_exchange_rate, get_file_names, check_for_duplicate_column_names, show_paged_transactions
+from program.transaction_store import TransactionStore
+from program.utils import get_file_names, show_paged_transactions, append_rows_to_file
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from program.transaction_columns import TransactionColumns
 
 
 @dataclass
 class Collection:
     _instance = None
-    transactions: List[Transaction] = field(default_factory=list)
+    transactions: Union[List[Transaction], "TransactionColumns"] = field(default_factory=list)  # TransactionColumns in columnar mode
+    columnar: bool = False
+    import_manifest: Optional[ImportManifest] = field(default=None, repr=False)
+    transaction_store: Optional[TransactionStore] = field(default=None, repr=False)
+    merchant_table: Optional[MerchantTable] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.columnar and isinstance(self.transactions, list):
+            from program.transaction_columns import TransactionColumns
+
+            self.transactions = TransactionColumns.from_transactions(self.transactions)
 
     @classmethod
     def get_instance(cls):
@@ -26,98 +40,163 @@ class Collection:
             cls._instance = Collection()
         return cls._instance
 
-    def to_dataframe(self) -> pd.DataFrame:
+    def to_dataframe(self) -> "pd.DataFrame":
         """Convert a list of Transaction objects into a Pandas DataFrame"""
-        return pd.DataFrame([t.to_dict() for t in self.transactions])
-
-    def import_data(self, directory: str) -> None:
-        """Import data from .csv files exported from bank website into defined classes."""
-        file_names = get_file_names(directory)
-        for file_name in file_names:
-            account_id = None
-            for config in CONFIG.accounts:
-                if config["keyword"] in file_name:
-                    account_id = config["id"]
-                    break
-            assert account_id is not None, f"No account id found for file: {file_name}"
-            ap = CONFIG.accounts[account_id]["ormInformation"]  # account prefix
-
-            with open(f"{directory}/{file_name}", "r", encoding="UTF-8", errors="replace") as file:
-                delimiter = ap["delimiter"]
-                csv_reader = csv.DictReader(file, delimiter=delimiter)
-
-                check_for_duplicate_column_names(file_name, csv_reader)
-
-                for row in csv_reader:
-                    try:
-                        date = datetime.strptime(row[ap["date"]], ap["dateFormat"])
-                        currency_code = ap["currencyCode"] if ap["currencyCode"] not in [""] else row["Currency"]
-                        bank = CONFIG.accounts[account_id]["bankName"]
-                        account_name = CONFIG.accounts[account_id]["accountType"].replace(" ", "_")
-
-                        description = row[ap["description"]].replace(";", "")
-                        if description in ["", None]:
-                            description = (
-                                    row[ap["secondDescription"]]
-                                    + " "
-                                    + row[ap["thirdDescription"]]
-                                    + " "
-                                    + row[ap["fourthDescription"]]
-                            )
-                        description = description.strip()
-
-                        # TODO fix this -_-
-                        if ap["amount"] == "Credit/Debit":  # For account id 2
-                            debit = float(row["Debit"]) if row["Debit"] else 0.0
-                            credit = float(row["Credit"]) if row["Credit"] else 0.0
-                            amount = credit if credit != 0.0 else -debit
-                        elif ap["amount"] == "Transaction Amount":  # For account id 1
-                            amount = (
-                                float(row[ap["amount"]])
-                                if row[ap["transactionType"]] == "Credit"
-                                else -float(row[ap["amount"]])
-                            )
-                        elif row[ap["transactionType"]] in ["EXCHANGE", "TOPUP"]: # For account id 4
-                            if float(row["Fee"]) == 0.0:
-                                continue
-                            amount = float(row["Fee"])
-                        else:
-                            amount = float(row[ap["amount"]].replace(",", ".").replace(" ", ""))
-
-                    except ValueError:
-                        print_warning_message(f"Error parsing row: {row} in file: {file_name}.")
-
-                    self.transactions.append(
-                        Transaction(
-                            description=description,
-                            date=date,
-                            amount_account_currency=amount,
-                            account_currency=currency_code,
-                            bank_name=bank,
-                            account=account_name,
-                            amount_usd=round(amount / get_exchange_rate(currency_code, is_test=bank), 2),
-                            origin_file_name=file_name,
-                            account_id=account_id,
-                        )
-                    )
-        return
+        if self.columnar:
+            return self.transactions.to_dataframe()
+        return Transaction.to_dataframe(self.transactions)
+
+    def import_data(
+        self, directory: str, workers: Optional[int] = None, skip_ledgered: bool = True, incremental: bool = False
+    ) -> None:
+        """Import data from .csv files exported from bank website into defined classes.
+
+        Set workers to parse the files in that many processes, the transactions keep the same order.
+        Transactions already in the directory's budget.csv are skipped unless skip_ledgered is False.
+        With incremental, unchanged files are skipped and files that grew are only read from their previous end.
+        In columnar mode the transactions are kept as a TransactionColumns instead of Transaction objects.
+        """
+        import pandas as pd
+
+        from program.statement_reader import read_statements, add_amount_usd, add_fingerprints
+
+        file_names, offsets = get_file_names(directory), None
+        if incremental:
+            self.import_manifest = ImportManifest(directory)
+            tasks = self.import_manifest.plan(file_names)
+            file_names, offsets = [t[0] for t in tasks], [t[1] for t in tasks]
+        frames = read_statements(directory, file_names, workers, offsets)
+        if self.import_manifest is not None:
+            for file_name, frame in zip(file_names, frames):
+                self.import_manifest.set_last_date(file_name, frame["date"].max() if not frame.empty else None)
+        if not frames:
+            return
+        occurrences = self.import_manifest.get_occurrences() if self.import_manifest is not None else None
+        data = add_fingerprints(pd.concat(frames, ignore_index=True), occurrences).drop_duplicates("fingerprint")
+        if skip_ledgered:
+            ledgered = LedgerIndex(f"{directory}/budget.csv").fingerprints
+            if self.transaction_store is not None:
+                ledgered = ledgered | self.transaction_store.get_processed(data["fingerprint"].tolist())
+            is_ledgered = data["fingerprint"].isin(ledgered)
+            if is_ledgered.any():
+                print_info_message(f"Skipping {is_ledgered.sum()} transactions already in budget.csv.")
+            data = data[~is_ledgered]
+            if data.empty:
+                return
+        data = add_amount_usd(data)
+        if self.columnar:
+            from program.transaction_columns import TransactionColumns
+
+            new_columns = TransactionColumns.from_frame(data)
+            self.transactions.extend(new_columns)
+            if self.transaction_store is not None:
+                self.transaction_store.upsert(new_columns)
+            return
+        dates = data["date"].dt.to_pydatetime()
+        new_transactions = [Transaction(**{**row, "date": date}) for row, date in zip(data.to_dict("records"), dates)]
+        self.transactions.extend(new_transactions)
+        if self.transaction_store is not None:
+            self.transaction_store.upsert(new_transactions)
 
 
     def format_and_tag_data(self) -> None:
-        """For each transaction in each account create a budget transaction item."""
-        processed_data = preprocess_historical_data(self.to_dataframe(), True)
-        numeric_tensor = torch.Tensor(processed_data[NUMERIC_COLUMNS].values)
-        text_tensor = torch.Tensor(processed_data[TEXT_COLUMNS].values)
-        trainer = MultimodalTrainer.load(MultimodalModel, MODEL_SAVE_DIRECTORY + "/saved_model.pth")
-        predictions = trainer.predict(numeric_tensor, text_tensor).tolist()
-        assert len(self.transactions) == len(predictions), "Length mismatch between transactions and predictions."
-        for t, p in zip(self.transactions, predictions):
-            t.tag = Tags(p)
+        """For each transaction in each account create a budget transaction item.
+
+        Merchants found in the merchant table are tagged from it, only the other transactions go through the model.
+        """
+        self.tag_transactions(self.transactions)
+        for t in self.transactions:
             check_description(t)
 
-    def review_data(self) -> None:
-        """Display the budget items to the user for review and allow them to edit the items."""
-        transactions = self.transactions
+    def tag_transactions(self, transactions: List[Transaction], verbose: bool = True) -> None:
+        """Tag transactions from the merchant table, or with the model when their merchant is unknown."""
+        unknown = transactions
+        if self.merchant_table is not None:
+            unknown = []
+            for t in transactions:
+                found = self.merchant_table.lookup(t.description)
+                if found is None:
+                    unknown.append(t)
+                else:
+                    t.tag, t.tag_source, t.confidence = found[0], TagSource.merchant_table, None
+        if len(unknown):
+            self.predict_tags(unknown, verbose)
+
+    def tag_in_background(self, chunk_size: int = 128) -> Iterator[List[Transaction]]:
+        """Tag the transactions chunk by chunk in a worker thread, each chunk is yielded as soon as it is tagged.
+
+        The worker does not print, so its messages do not interleave with the review prompts of the caller.
+        """
+        tagged_chunks = queue.Queue()
+
+        def tag_chunks() -> None:
+            try:
+                for start in range(0, len(self.transactions), chunk_size):
+                    chunk = self.transactions[start:start + chunk_size]
+                    self.tag_transactions(chunk, verbose=False)
+                    tagged_chunks.put(chunk)
+            except BaseException as error:
+                tagged_chunks.put(error)
+            tagged_chunks.put(None)
+
+        worker = threading.Thread(target=tag_chunks, name="tagger", daemon=True)
+        worker.start()
+        while (chunk := tagged_chunks.get()) is not None:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+        worker.join()
+
+    def format_and_review_pipelined(self, chunk_size: int = 128) -> None:
+        """Check and review each chunk of transactions while the next chunks are tagged in the background."""
+        for chunk in self.tag_in_background(chunk_size):
+            for t in chunk:
+                check_description(t)
+            self.review_data(chunk)
+
+    def predict_tags(self, transactions: List[Transaction], verbose: bool = True) -> None:
+        """Tag transactions with the model, keeping the probability of each tag as its confidence."""
+        from ai.data_loader import preprocess_historical_data
+        from ai.model_registry import ModelRegistry
+
+        trainer = ModelRegistry.get_instance().get_trainer(MODEL_SAVE_DIRECTORY + "/saved_model.pth")
+        data = self.to_dataframe() if transactions is self.transactions else Transaction.to_dataframe(transactions)
+        processed_data = preprocess_historical_data(data, True, text_encoder=trainer.text_encoder, verbose=verbose)
+        predictions, confidences = [], []
+        for batch_predictions, probabilities in trainer.predict_batches([processed_data.tensors()]):
+            predictions.extend(batch_predictions.tolist())
+            confidences.extend(probabilities.max(dim=1).values.tolist())
+        assert len(transactions) == len(predictions), "Length mismatch between transactions and predictions."
+        for t, p, c in zip(transactions, predictions, confidences):
+            t.tag = Tags(p)
+            t.tag_source = TagSource.model
+            t.confidence = c
+
+    def get_review_queue(self, threshold: Optional[float] = None, transactions: Optional[List[Transaction]] = None) -> list:
+        """Transactions to review: flagged by a keyword rule, no tag after the keyword check, no description, or a tag
+        that is not from a rule, the merchant table or the user and has no model confidence of at least threshold.
+        """
+        threshold = get_auto_accept_threshold() if threshold is None else threshold
+        transactions = self.transactions if transactions is None else transactions
+        accepted_sources = [TagSource.rule, TagSource.merchant_table, TagSource.user]
+        return [
+            t
+            for t in transactions
+            if t.flagged
+            or t.tag is None
+            or not t.description
+            or (t.tag_source not in accepted_sources and (t.confidence is None or t.confidence < threshold))
+        ]
+
+    def review_data(self, transactions: Optional[List[Transaction]] = None) -> None:
+        """Display the budget items that need review to the user and allow them to edit the items."""
+        candidates = self.transactions if transactions is None else transactions
+        transactions = self.get_review_queue(transactions=candidates)
+        auto_accepted = len(candidates) - len(transactions)
+        if auto_accepted:
+            print_info_message(f"Auto-accepted {auto_accepted} transactions with a confident tag.")
+        if not transactions:
+            return
         show_paged_transactions(transactions)
         page = 0
         while True:
@@ -141,7 +220,7 @@ class Collection:
                     continue
                 item = transactions[user_input]
                 print(
-                    f'{item.amount_account_currency:10.2f} \t\t {item.date.strftime("%m/%d/%y")} \t {item.tag.value} \t {item.account.value} \t {item.description}'
+                    f'{item.amount_account_currency:10.2f} \t\t {item.date.strftime("%m/%d/%y")} \t {item.tag.value if item.tag else ""} \t {item.account.value} \t {item.description}'
                 )
                 tag = get_tag()
                 desc = input("\tEnter description: ")
@@ -154,27 +233,45 @@ class Collection:
                 if response.lower() == "y":
                     item.tag = Tags(tag)
                     item.description = desc
+                    item.tag_source = TagSource.user
+                    item.confidence = None
+                    item.flagged = False
                 else:
                     print("Item discarded.")
 
-    def insert_data_to_file(self, directory: str) -> None:
-        """Insert budget items into budget.csv file."""
+    def insert_data_to_file(self, directory: str, ledger_format: str = "csv") -> None:
+        """Insert budget items into budget.csv file, the parquet ledger, or both with ledger_format "both".
+
+        The tag_source column tells whether the tag comes from the model, the merchant table, a keyword rule or the user,
+        the confidence column keeps the model probability of the tag and is empty for the other sources.
+        """
+        assert ledger_format in ["csv", "parquet", "both"], f"Unknown ledger format: {ledger_format}"
 
         budget_items = self.transactions
         sorted_budget_items = sorted(budget_items, key=lambda x: x.date)
-        for item in sorted_budget_items:
-            with open(f"{directory}/budget.csv", "a") as file:
-                csv_writer = csv.writer(file)
-                if item.tag:
-                    csv_writer.writerow(
-                        [
-                            item.date.strftime("%Y-%m-%d"),
-                            item.bank_name,
-                            item.account.value,
-                            item.amount_account_currency,
-                            item.account_currency,
-                            item.amount_usd,
-                            item.tag.name,
-                            item.description,
-                        ]
-                    )
\ No newline at end of file
+        rows = [  # In the order of LEDGER_COLUMNS
+            [
+                item.date.strftime("%Y-%m-%d"),
+                item.bank_name,
+                item.account.value,
+                item.amount_account_currency,
+                item.account_currency,
+                item.amount_usd,
+                item.tag.name,
+                item.description,
+                round(item.confidence, 4) if item.confidence is not None else None,
+                item.tag_source.value if item.tag_source else None,
+            ]
+            for item in sorted_budget_items
+            if item.tag
+        ]
+        if ledger_format in ["csv", "both"]:
+            append_rows_to_file(f"{directory}/budget.csv", rows, LEDGER_COLUMNS)
+        if ledger_format in ["parquet", "both"]:
+            ParquetLedger(f"{directory}/{PARQUET_LEDGER_NAME}").append(rows)
+        # Skipped transactions are recorded as well, so they are not imported and reviewed again
+        record_fingerprints(f"{directory}/budget.csv", (item.fingerprint for item in sorted_budget_items))
+        if self.transaction_store is not None:
+            self.transaction_store.upsert(sorted_budget_items, is_processed=True)
+        if self.import_manifest is not None:
+            self.import_manifest.save()
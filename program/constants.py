@@ -1,5 +1,6 @@
 import os
 from enum import Enum, auto
+from functools import lru_cache
 import json
 
 CONFIG_FILE = os.getenv("ENV")
@@ -30,14 +31,27 @@ class Tags(Enum):
     vacation = auto()
 
 
+class TagSource(Enum):
+    """Where the tag of a transaction comes from, only model tags have a confidence."""
+    model = "model"
+    merchant_table = "merchant_table"
+    rule = "rule"
+    user = "user"
+
+
 N_CLASSES = len(Tags)
 N_NUMERICAL_FEATURES = 4 # Year, Month, Day, Amount
 # MODEL_SAVE_DIRECTORY = os.path.join(os.getcwd(), "private/saved_model")
 user = os.getenv("USER")
 SECRETS_DIR = f"/home/{user}/secrets/statement-funnel"
 MODEL_SAVE_DIRECTORY = f"{SECRETS_DIR}/private/saved_model"
+EMBEDDING_CACHE_PATH = f"{MODEL_SAVE_DIRECTORY}/embedding_cache.db"
+PARQUET_LEDGER_NAME = "budget_parquet"
+TRANSACTION_STORE_NAME = "transactions.db"
 NUMERIC_COLUMNS = ['amount_usd', 'year', 'month', 'day']
-TEXT_COLUMNS = [i for i in range(768)]  # Generates ["0", ..., "767"]
+DEFAULT_AUTO_ACCEPT_THRESHOLD = 0.95  # Overridden by autoAcceptThreshold in the config file
+EXCHANGE_RATE_LOG = "exchange_usd_rate_history.log"
+EXCHANGE_RATE_DB = "exchange_usd_rates.db"
 
 class Config:
     def __init__(self, config_data):
@@ -45,9 +59,23 @@ class Config:
             setattr(self, key, value)
 
 CONFIG_FILE = f"{SECRETS_DIR}/.env.json"
-# Load the configuration file
-with open(CONFIG_FILE, "r") as config_file:
-    config_data = json.load(config_file)
 
-# Create a Config instance
-CONFIG = Config(config_data)
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Load the configuration file on first use instead of at import time."""
+    with open(CONFIG_FILE, "r") as config_file:
+        config_data = json.load(config_file)
+    return Config(config_data)
+
+
+def get_auto_accept_threshold() -> float:
+    """Model confidence from which a predicted tag is accepted without review."""
+    return float(getattr(get_config(), "autoAcceptThreshold", DEFAULT_AUTO_ACCEPT_THRESHOLD))
+
+
+def __getattr__(name: str):
+    """Keep `constants.CONFIG` working, it is loaded when first accessed."""
+    if name == "CONFIG":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,168 @@
+import csv
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from program.constants import get_config, EXCHANGE_RATE_LOG, EXCHANGE_RATE_DB
+from program.helper_functions import print_warning_message
+
+API_URL = "https://v6.exchangerate-api.com/v6"
+FETCH_WORKERS = 8
+FETCH_TIMEOUT_SECONDS = 10
+MAX_FALLBACK_AGE_DAYS = 7  # Oldest stored rate used when the rate of a day cannot be fetched
+
+
+class ExchangeRateStore:
+    """USD exchange rates per (currency, day) kept in an indexed sqlite table."""
+
+    _instance = None
+
+    def __init__(self, db_path: str = EXCHANGE_RATE_DB, log_path: str = EXCHANGE_RATE_LOG):
+        self.db_path = db_path
+        self.log_path = log_path
+        self._local = threading.local()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS rates ("
+            "currency TEXT NOT NULL, day TEXT NOT NULL, rate REAL NOT NULL, PRIMARY KEY (currency, day)"
+            ") WITHOUT ROWID"
+        )
+        if self.connection.execute("SELECT COUNT(*) FROM rates").fetchone()[0] == 0:
+            self._migrate_log()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ExchangeRateStore()
+        return cls._instance
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread, sqlite connections cannot be shared by threads or forked processes."""
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = sqlite3.connect(self.db_path, timeout=30)
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _migrate_log(self) -> None:
+        """Seed the store from the append-only history log, keeping the newest rate of each day."""
+        if not os.path.isfile(self.log_path):
+            return
+        with open(self.log_path, "r") as file:
+            rows = sorted(
+                (datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S"), row[1], float(row[2]))
+                for row in csv.reader(file)
+                if len(row) >= 3
+            )
+        self._store({(currency, timestamp.date()): rate for timestamp, currency, rate in rows})
+
+    def _store(self, rates: Dict[Tuple[str, date], float]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO rates (currency, day, rate) VALUES (?, ?, ?)",
+                [(currency, day.isoformat(), rate) for (currency, day), rate in rates.items()],
+            )
+
+    def lookup(self, currency: str, day: date, max_age: Optional[int] = None) -> Optional[float]:
+        """Get the stored rate closest to day using the (currency, day) index, or None if it is max_age days off or more."""
+        candidates = []
+        for comparison, order in (("<=", "DESC"), (">=", "ASC")):
+            row = self.connection.execute(
+                f"SELECT day, rate FROM rates WHERE currency = ? AND day {comparison} ? ORDER BY day {order} LIMIT 1",
+                (currency, day.isoformat()),
+            ).fetchone()
+            if row is not None:
+                candidates.append((abs((date.fromisoformat(row[0]) - day).days), row[1]))
+        if not candidates:
+            return None
+        age, rate = min(candidates)
+        return rate if max_age is None or age < max_age else None
+
+    def get_rate(self, currency: str = "CZK", day: Optional[date] = None, is_test: str = "Test Bank") -> float:
+        """Get the rate of a currency on a given day, today by default."""
+        day = day or date.today()
+        return self.resolve([(currency, day)], is_test)[(currency, day)]
+
+    def resolve(self, pairs: Iterable[Tuple[str, date]], is_test: str = "Test Bank") -> Dict[Tuple[str, date], float]:
+        """Get rates for many (currency, day) pairs, prefetching all missing days before the lookups.
+
+        A day that cannot be fetched uses the closest stored rate up to MAX_FALLBACK_AGE_DAYS away, beyond that it
+        raises a ValueError. The test bank accepts any stored rate.
+        """
+        max_age = 180 if is_test == "Test Bank" else 1
+        fallback_age = None if is_test == "Test Bank" else max(max_age, MAX_FALLBACK_AGE_DAYS)
+        resolved, missing = {}, []
+        for currency, day in set(pairs):
+            rate = 1.0 if currency == "USD" else self.lookup(currency, day, max_age)
+            if rate is None:
+                missing.append((currency, day))
+            else:
+                resolved[(currency, day)] = rate
+
+        if missing:
+            self.prefetch({day for _, day in missing}, max_age)
+        for currency, day in missing:
+            rate = self.lookup(currency, day, max_age)
+            if rate is None:
+                rate = self.lookup(currency, day, fallback_age)
+                if rate is not None:
+                    print_warning_message(f"No {currency} rate within {max_age} days of {day}, using the closest stored rate.")
+            if rate is None:
+                raise ValueError(f"Exchange rate for currency {currency} on {day} not found and could not be fetched.")
+            resolved[(currency, day)] = rate
+        return resolved
+
+    def prefetch_range(self, start: date, end: date, currencies: Iterable[str], max_age: int = 1) -> None:
+        """Fetch the rates of every day between start and end that are not stored for all currencies yet."""
+        currencies = set(currencies) - {"USD"}
+        if not currencies:
+            return
+        stored = {
+            date.fromisoformat(day)
+            for (day,) in self.connection.execute(
+                f"SELECT day FROM rates WHERE day BETWEEN ? AND ? AND currency IN ({','.join('?' * len(currencies))}) "
+                f"GROUP BY day HAVING COUNT(*) = ?",
+                (start.isoformat(), end.isoformat(), *currencies, len(currencies)),
+            )
+        }
+        days = (start + timedelta(days=n) for n in range((end - start).days + 1))
+        self.prefetch([day for day in days if day not in stored], max_age)
+
+    def prefetch(self, days: Iterable[date], max_age: int = 1) -> None:
+        """Fetch rates for the given days, one API call per day since every call returns all currencies.
+
+        Days within max_age of an earlier requested day are covered by it and skipped. The API has no range
+        endpoint, so the calls run concurrently and all fetched rates are stored in one transaction.
+        """
+        requested = []
+        for day in sorted({min(day, date.today()) for day in days}):
+            if not requested or (day - requested[-1]).days >= max_age:
+                requested.append(day)
+        if not requested:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(requested))) as executor:
+            fetched = list(executor.map(self._fetch, requested))
+        self._store({(currency, day): rate for day, rates in zip(requested, fetched) for currency, rate in rates.items()})
+
+    @staticmethod
+    def _fetch(day: date) -> Dict[str, float]:
+        """Get the rates of all currencies on a day from the API, empty if the call fails."""
+        import requests
+
+        api_key = get_config().exchangeRateApiKey
+        if day >= date.today():
+            url = f"{API_URL}/{api_key}/latest/USD"
+        else:
+            url = f"{API_URL}/{api_key}/history/USD/{day.year}/{day.month}/{day.day}"
+        try:
+            response = requests.get(url, timeout=FETCH_TIMEOUT_SECONDS)
+        except requests.RequestException as error:
+            print_warning_message(f"Unable to fetch exchange rates for {day} ({error.__class__.__name__}).")
+            return {}
+        if response.status_code != 200:
+            print_warning_message(f"Unable to fetch exchange rates for {day} (status code: {response.status_code}).")
+            return {}
+        return {currency: float(rate) for currency, rate in response.json().get("conversion_rates", {}).items()}
@@ -1,36 +1,36 @@
 from program.transaction_class import Transaction
 from program.transaction_class import Tags
+from program.constants import TagSource
 from typing import TypeVar
-from program.constants import CONFIG
+from program.keyword_rules import get_keyword_matcher
 
 T = TypeVar("T")
 
 
 def check_description(t: Transaction):
-    """Mainly want to handle venmo and atm withdrawals and review/label transactions manually."""
-    description = t.description
-    if "ATM " in description:
-        t.description = "cash"
-        t.tag = Tags.misc
+    """Apply the keyword rules, e.g. venmo and atm withdrawals, and review/label transactions manually."""
+    rule = get_keyword_matcher().match(t.description)
+    t.flagged = rule is not None and rule.flags_review
+    if rule is not None and rule.skip:
+        t.tag, t.tag_source, t.confidence = None, None, None
         return
 
-    if " VENMO " in description:
+    if rule is not None and rule.ask_description:
         if t.tag is None:
-            t.tag = determine_tag(t)
+            t.tag, t.tag_source = determine_tag(t), TagSource.user
         print(t.date.strftime("%m/%d/%y"), "--", t.amount_account_currency, "--", t.description)
-        desc_info = input("\tEnter VENMO description: ")
-        t.description = f"VENMO: {desc_info}"
+        desc_info = input(f"\tEnter {rule.description} description: ")
+        t.description = f"{rule.description}: {desc_info}"
         return
 
-    keywords = CONFIG.globalKeywords
-    for keyword in keywords:
-        if keyword == description or keyword in description:
-            t.tag = None
-            return
+    if rule is not None:
+        t.description = rule.description or t.description
+        if rule.tag is not None:
+            t.tag, t.tag_source, t.confidence = rule.tag, TagSource.rule, None
 
     if t.tag is None:
-        t.tag = determine_tag(t)
-    if description in ["", None]:
+        t.tag, t.tag_source = determine_tag(t), TagSource.user
+    if t.description in ["", None]:
         print(t.date.strftime("%m/%d/%y"), "--", t.amount_account_currency, "--", t.bank_name, "--", t.tag.name)
         desc_info = input("\tAdd description (click Enter to skip): ")
         t.description = desc_info
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_FILE_NAME = "import_manifest.json"
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: str, prefix_size: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    """Get the sha256 of a whole file and, in the same pass, of its first prefix_size bytes."""
+    full_hash, prefix_hash = hashlib.sha256(), hashlib.sha256() if prefix_size is not None else None
+    read = 0
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            full_hash.update(chunk)
+            if prefix_hash is not None and read < prefix_size:
+                prefix_hash.update(chunk[:prefix_size - read])
+            read += len(chunk)
+    return full_hash.hexdigest(), prefix_hash.hexdigest() if prefix_hash is not None else None
+
+
+class ImportManifest:
+    """Per-file watermarks of the statements already imported from a directory.
+
+    Each entry keeps the size, mtime and sha256 of the file, the last transaction date ingested from it and how many
+    times each transaction was read from it, so identical rows appended later are numbered after the earlier ones.
+    Changes are staged and only written by save, after the transactions reached the ledger.
+    """
+
+    def __init__(self, directory: str):
+        self.path = f"{directory}/{MANIFEST_FILE_NAME}"
+        self.directory = directory
+        self.entries: Dict[str, dict] = {}
+        self.pending: Dict[str, dict] = {}
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as file:
+                self.entries = json.load(file)
+
+    def plan(self, file_names: List[str]) -> List[Tuple[str, int]]:
+        """Get the files to read with the byte offset to read them from, unchanged files are left out.
+
+        A file that only grew from the end is read from its previous size, any other change means a full read, as does
+        an entry written before the occurrence counts were kept.
+        """
+        tasks = []
+        for file_name in file_names:
+            path = f"{self.directory}/{file_name}"
+            stat = os.stat(path)
+            entry = self.entries.get(file_name)
+            if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+
+            grew = entry is not None and stat.st_size > entry["size"]
+            sha256, prefix_sha256 = hash_file(path, entry["size"] if grew else None)
+            if entry is not None and entry["sha256"] == sha256:
+                self.pending[file_name] = {**entry, "mtime": stat.st_mtime}
+                continue
+
+            offset = entry["size"] if grew and prefix_sha256 == entry["sha256"] and "occurrences" in entry else 0
+            self.pending[file_name] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha256": sha256,
+                "last_date": entry["last_date"] if offset else None,
+                "occurrences": dict(entry["occurrences"]) if offset else {},
+            }
+            tasks.append((file_name, offset))
+        return tasks
+
+    def set_last_date(self, file_name: str, last_date: Optional[datetime]) -> None:
+        """Move the date watermark of a file forward to the newest transaction read from it."""
+        entry = self.pending[file_name]
+        if last_date is not None:
+            last_date = last_date.strftime("%Y-%m-%d")
+            entry["last_date"] = max(filter(None, [entry["last_date"], last_date]))
+
+    def get_occurrences(self) -> Dict[str, Dict[str, int]]:
+        """Occurrence counts of the files to read, updating them updates the staged entries."""
+        return {file_name: entry["occurrences"] for file_name, entry in self.pending.items() if "occurrences" in entry}
+
+    def save(self) -> None:
+        """Write the staged entries to the manifest file."""
+        if not self.pending:
+            return
+        self.entries.update(self.pending)
+        self.pending = {}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,108 @@
+import math
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from program.constants import Tags, get_config
+
+MATCH_CACHE_SIZE = 1 << 16
+
+
+@dataclass(frozen=True)
+class KeywordRule:
+    """What to do with a transaction whose description contains keyword.
+
+    skip leaves the transaction untagged for review, ask_description prompts for a description prefixed with
+    description, otherwise description and tag, when set, replace those of the transaction.
+    """
+    keyword: str
+    tag: Optional[Tags] = None
+    description: Optional[str] = None
+    skip: bool = False
+    ask_description: bool = False
+
+    @property
+    def flags_review(self) -> bool:
+        """Whether a matching transaction goes to review whatever the confidence of its tag."""
+        return self.skip or self.ask_description
+
+    @classmethod
+    def from_config(cls, rule: dict) -> "KeywordRule":
+        """Rule from a keywordRules entry, e.g. {"keyword": "NETFLIX", "tag": "utilities"}."""
+        return cls(
+            keyword=rule["keyword"],
+            tag=Tags[rule["tag"]] if rule.get("tag") else None,
+            description=rule.get("description"),
+            skip=bool(rule.get("skip", False)),
+        )
+
+
+BUILT_IN_RULES = [
+    KeywordRule("ATM ", tag=Tags.misc, description="cash"),
+    KeywordRule(" VENMO ", description="VENMO", ask_description=True),
+]
+
+
+class KeywordMatcher:
+    """Keyword rules compiled into an Aho-Corasick automaton, a description is scanned once whatever the number of rules.
+
+    Each state keeps the lowest index of the rules whose keyword ends there, so the rule listed first wins when
+    several keywords match. Results of the last MATCH_CACHE_SIZE descriptions are cached.
+    """
+
+    def __init__(self, rules: List[KeywordRule]):
+        self.rules = rules
+        self.transitions: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.best_rule: List[float] = [math.inf]
+        for index, rule in enumerate(rules):
+            self._add_keyword(rule.keyword, index)
+        self._link()
+        self.match = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._match)
+
+    def _add_keyword(self, keyword: str, index: int) -> None:
+        state = 0
+        for character in keyword:
+            if character not in self.transitions[state]:
+                self.transitions[state][character] = len(self.transitions)
+                self.transitions.append({})
+                self.fail.append(0)
+                self.best_rule.append(math.inf)
+            state = self.transitions[state][character]
+        self.best_rule[state] = min(self.best_rule[state], index)
+
+    def _link(self) -> None:
+        """Set the failure links breadth first, a state also reports the rules of its longest proper suffix."""
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, child in self.transitions[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and character not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(character, 0)
+                self.best_rule[child] = min(self.best_rule[child], self.best_rule[self.fail[child]])
+
+    def _match(self, description: str) -> Optional[KeywordRule]:
+        if description is None:
+            return None
+        transitions, fail, best_rule = self.transitions, self.fail, self.best_rule
+        state, best = 0, best_rule[0]
+        for character in description:
+            while state and character not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(character, 0)
+            best = min(best, best_rule[state])
+        return self.rules[best] if best != math.inf else None
+
+
+@lru_cache(maxsize=1)
+def get_keyword_matcher() -> KeywordMatcher:
+    """Matcher of the built-in rules, then the keywordRules and the globalKeywords of the config file."""
+    config = get_config()
+    rules = list(BUILT_IN_RULES)
+    rules += [KeywordRule.from_config(rule) for rule in getattr(config, "keywordRules", [])]
+    rules += [KeywordRule(keyword, skip=True) for keyword in config.globalKeywords]
+    return KeywordMatcher(rules)
@@ -0,0 +1,83 @@
+import csv
+import hashlib
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Set
+
+from program.constants import Account
+
+FINGERPRINT_FILE_SUFFIX = ".fingerprints"
+
+
+def make_fingerprint(date: datetime, bank_name: str, account: str, amount: float, description: str, occurrence: int = 0) -> str:
+    """Hash identifying a transaction, occurrence tells apart identical transactions of the same statement."""
+    key = f"{date.strftime('%Y-%m-%d')}|{bank_name}|{account}|{float(amount):.2f}|{description.strip()}|{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def get_account_value(account: str) -> str:
+    """Account as written to budget.csv, imports use the enum name and the ledger its value."""
+    try:
+        return Account[account.upper()].value
+    except KeyError:
+        return account
+
+
+class LedgerIndex:
+    """Set of fingerprints of the transactions already in budget.csv, loaded once per run.
+
+    Fingerprints are computed from the ledger rows and read from a sidecar file, which keeps the import-time
+    fingerprints of inserted transactions whose description was edited during review.
+    """
+
+    def __init__(self, ledger_path: str):
+        self.ledger_path = ledger_path
+        self.sidecar_path = ledger_path + FINGERPRINT_FILE_SUFFIX
+        self.fingerprints: Set[str] = set()
+        self._load()
+
+    def _load(self) -> None:
+        if os.path.isfile(self.sidecar_path):
+            with open(self.sidecar_path, "r") as file:
+                self.fingerprints.update(line.strip() for line in file if line.strip())
+
+        if not os.path.isfile(self.ledger_path):
+            return
+        occurrences = Counter()
+        with open(self.ledger_path, "r", encoding="UTF-8", errors="replace") as file:
+            for row in csv.DictReader(file):
+                try:
+                    key = (
+                        datetime.strptime(row["date"], "%Y-%m-%d"),
+                        row.get("bank_name", row.get("bank")),
+                        row["account"],
+                        float(row["amount_account_currency"]),
+                        row["description"] or "",
+                    )
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self.fingerprints.add(make_fingerprint(*key, occurrences[key]))
+                occurrences[key] += 1
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return fingerprint in self.fingerprints
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def add(self, fingerprints: Iterable[str]) -> None:
+        """Record fingerprints of newly ledgered transactions in the sidecar file."""
+        new_fingerprints = [f for f in fingerprints if f and f not in self.fingerprints]
+        if not new_fingerprints:
+            return
+        self.fingerprints.update(new_fingerprints)
+        record_fingerprints(self.ledger_path, new_fingerprints)
+
+
+def record_fingerprints(ledger_path: str, fingerprints: Iterable[str]) -> None:
+    """Append fingerprints to the sidecar file of a ledger with a single write."""
+    lines = "".join(f"{f}\n" for f in fingerprints if f)
+    if lines:
+        with open(ledger_path + FINGERPRINT_FILE_SUFFIX, "a") as file:
+            file.write(lines)
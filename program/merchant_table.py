@@ -0,0 +1,64 @@
+import csv
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Tuple
+
+from program.constants import Tags
+
+NON_LETTERS = re.compile(r"[\W\d_]+")
+
+
+def normalize_description(description: Optional[str]) -> str:
+    """Description without case, digits and punctuation, so store numbers and references do not split a merchant."""
+    return " ".join(NON_LETTERS.sub(" ", (description or "").upper()).split())
+
+
+class MerchantTable:
+    """Tags of the merchants that the labelled ledger always tags the same way.
+
+    A normalized description is kept when it appears at least min_count times and its most common tag has at
+    least a purity share of them. Lookups are counted to report the hit rate of a run.
+    """
+
+    def __init__(self, tags: Dict[str, Tuple[Tags, float]]):
+        self.tags = tags
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def from_ledger(cls, ledger_path: str, min_count: int = 3, purity: float = 0.95) -> "MerchantTable":
+        """Build the table from the description and tag columns of budget.csv."""
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        if os.path.isfile(ledger_path):
+            with open(ledger_path, "r", encoding="UTF-8", errors="replace") as file:
+                for row in csv.DictReader(file):
+                    merchant, tag = normalize_description(row.get("description")), row.get("tag")
+                    if merchant and tag in Tags.__members__:
+                        counts[merchant][tag] += 1
+
+        tags = {}
+        for merchant, tag_counts in counts.items():
+            total = sum(tag_counts.values())
+            tag, count = tag_counts.most_common(1)[0]
+            if total >= min_count and count / total >= purity:
+                tags[merchant] = (Tags[tag], count / total)
+        return cls(tags)
+
+    def lookup(self, description: Optional[str]) -> Optional[Tuple[Tags, float]]:
+        """Tag of a description and the share of its ledger rows with that tag, None for unknown merchants."""
+        self.lookups += 1
+        found = self.tags.get(normalize_description(description))
+        if found is not None:
+            self.hits += 1
+        return found
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def report(self) -> str:
+        return f"Merchant table tagged {self.hits} of {self.lookups} transactions ({self.hit_rate:.0%}) without the model."
@@ -0,0 +1,117 @@
+import os
+from datetime import date
+from typing import List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+LEDGER_COLUMNS = [
+    "date",
+    "bank_name",
+    "account",
+    "amount_account_currency",
+    "account_currency",
+    "amount_usd",
+    "tag",
+    "description",
+    "confidence",
+    "tag_source",
+]
+
+def import_pyarrow():
+    """pyarrow is only needed for the parquet ledger, so it is an optional dependency."""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("The parquet ledger needs pyarrow, install it with `pip install pyarrow`.") from error
+    return pyarrow
+
+
+class ParquetLedger:
+    """Columnar copy of budget.csv, a parquet dataset partitioned by year and month."""
+
+    def __init__(self, root: str):
+        self.root = root
+        pa = import_pyarrow()
+        self.schema = pa.schema(
+            [
+                ("date", pa.date32()),
+                ("bank_name", pa.string()),
+                ("account", pa.string()),
+                ("amount_account_currency", pa.float64()),
+                ("account_currency", pa.string()),
+                ("amount_usd", pa.float64()),
+                ("tag", pa.string()),
+                ("description", pa.string()),
+                ("confidence", pa.float64()),
+                ("tag_source", pa.string()),
+            ]
+        )
+        partition_schema = pa.schema([("year", pa.int16()), ("month", pa.int8())])
+        self.partitioning = pa.dataset.partitioning(partition_schema, flavor="hive")
+        # Files written before a column was added read it as null
+        self.dataset_schema = pa.unify_schemas([self.schema, partition_schema])
+
+    def append(self, rows: List[list]) -> None:
+        """Write ledger rows, in budget.csv column order, as new files of their year/month partitions."""
+        import pandas as pd
+
+        if rows:
+            self.append_frame(pd.DataFrame(rows, columns=LEDGER_COLUMNS[:len(rows[0])]))
+
+    def append_frame(self, data: "pd.DataFrame") -> None:
+        """Write a DataFrame with the ledger columns as new files of their year/month partitions."""
+        pa = import_pyarrow()
+        import pandas as pd
+
+        dates = pd.to_datetime(data["date"])
+        data = data.reindex(columns=LEDGER_COLUMNS).assign(date=dates.dt.date)
+        table = pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+        table = table.append_column("year", pa.array(dates.dt.year, pa.int16()))
+        table = table.append_column("month", pa.array(dates.dt.month, pa.int8()))
+        pa.parquet.write_to_dataset(table, self.root, partitioning=self.partitioning)
+
+    def read(self, columns: Optional[List[str]] = None, since: Optional[date] = None) -> "pd.DataFrame":
+        """
+        Read the ledger with column pruning and predicate pushdown.
+
+        :param columns: Columns to read, all ledger columns by default.
+        :param since: Only read transactions on or after this date, older year partitions are not opened.
+        :return: DataFrame sorted by date.
+        """
+        pa = import_pyarrow()
+        import pandas as pd
+
+        columns = columns or LEDGER_COLUMNS
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns)
+        dataset = pa.dataset.dataset(self.root, schema=self.dataset_schema, format="parquet", partitioning=self.partitioning)
+        row_filter = None
+        if since is not None:
+            row_filter = (pa.dataset.field("year") >= since.year) & (pa.dataset.field("date") >= pa.scalar(since, pa.date32()))
+        data = dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+        if "date" in data:
+            data["date"] = pd.to_datetime(data["date"])
+            data = data.sort_values("date", kind="stable").reset_index(drop=True)
+        return data
+
+    def export_csv(self, csv_path: str) -> None:
+        """Write the whole ledger as a budget.csv for consumers of the csv format."""
+        data = self.read()
+        data["date"] = data["date"].dt.strftime("%Y-%m-%d")
+        data.to_csv(csv_path, index=False)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, root: str) -> "ParquetLedger":
+        """Build a parquet ledger from an existing budget.csv, columns under an older name are renamed."""
+        import pandas as pd
+
+        from program.utils import COLUMN_ALIASES
+
+        renames = {alias: column for column, alias in COLUMN_ALIASES.items()}
+        data = pd.read_csv(csv_path, usecols=lambda column: column in LEDGER_COLUMNS or column in renames, sep=",", quotechar='"')
+        ledger = cls(root)
+        ledger.append_frame(data.rename(columns=renames))
+        return ledger
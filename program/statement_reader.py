@@ -0,0 +1,171 @@
+import csv
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from program.constants import get_config
+from program.exchange_rate_class import ExchangeRateStore
+from program.helper_functions import print_warning_message
+from program.ledger_index import make_fingerprint, get_account_value
+from program.utils import check_for_duplicate_column_names
+
+STATEMENT_COLUMNS = [
+    "description",
+    "date",
+    "amount_account_currency",
+    "account_currency",
+    "bank_name",
+    "account",
+    "origin_file_name",
+    "account_id",
+]
+
+
+def get_account_id(file_name: str) -> int:
+    """Find the id of the account whose keyword is in the file name."""
+    account_id = None
+    for config in get_config().accounts:
+        if config["keyword"] in file_name:
+            account_id = config["id"]
+            break
+    assert account_id is not None, f"No account id found for file: {file_name}"
+    return account_id
+
+
+def read_statement(directory: str, file_name: str, offset: int = 0) -> pd.DataFrame:
+    """Read a .csv statement and print a warning for every row that could not be parsed."""
+    data, warnings = parse_statement(directory, file_name, offset)
+    for message in warnings:
+        print_warning_message(message)
+    return data
+
+
+def read_statements(
+    directory: str, file_names: List[str], workers: Optional[int] = None, offsets: Optional[List[int]] = None
+) -> List[pd.DataFrame]:
+    """Read statements one after another, or in a process pool with one task per file when workers is set.
+
+    Frames and warnings are returned in the order of file_names either way.
+    """
+    offsets = offsets or [0] * len(file_names)
+    if not workers or len(file_names) < 2:
+        return [read_statement(directory, file_name, offset) for file_name, offset in zip(file_names, offsets)]
+
+    frames = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(parse_statement, directory, file_name, offset) for file_name, offset in zip(file_names, offsets)
+        ]
+        for future in futures:
+            data, warnings = future.result()
+            for message in warnings:
+                print_warning_message(message)
+            frames.append(data)
+    return frames
+
+
+def parse_statement(directory: str, file_name: str, offset: int = 0) -> Tuple[pd.DataFrame, List[str]]:
+    """Parse a .csv statement with a single read_csv call and column operations into the statement format.
+
+    :param offset: Byte offset to start reading rows from, the header is always read from the start of the file.
+    :return: The parsed statement and the warnings for rows that were skipped.
+    """
+    account_id = get_account_id(file_name)
+    account = get_config().accounts[account_id]
+    ap = account["ormInformation"]  # account prefix
+    path = f"{directory}/{file_name}"
+
+    with open(path, "rb") as file:
+        header = file.readline()
+        if offset:
+            file.seek(offset)
+            source = io.StringIO((header + file.read()).decode("UTF-8", errors="replace"))
+        else:
+            source = path
+    header = header.decode("UTF-8", errors="replace")
+    check_for_duplicate_column_names(file_name, next(csv.reader([header], delimiter=ap["delimiter"]), []))
+    raw = pd.read_csv(
+        source, sep=ap["delimiter"], dtype=str, keep_default_na=False, encoding="UTF-8", encoding_errors="replace"
+    ).fillna("")
+
+    data = pd.DataFrame(index=raw.index)
+    data["date"] = pd.to_datetime(raw[ap["date"]], format=ap["dateFormat"], errors="coerce")
+
+    description = raw[ap["description"]].str.replace(";", "")
+    fallback = (
+        raw.get(ap["secondDescription"], "")
+        + " "
+        + raw.get(ap["thirdDescription"], "")
+        + " "
+        + raw.get(ap["fourthDescription"], "")
+    )
+    data["description"] = description.where(description != "", fallback).str.strip()
+
+    # TODO fix this -_-
+    keep = pd.Series(True, index=raw.index)
+    transaction_type = raw[ap["transactionType"]] if ap.get("transactionType") in raw else None
+    if ap["amount"] == "Credit/Debit":  # For account id 2
+        debit = pd.to_numeric(raw["Debit"].replace("", "0"), errors="coerce")
+        credit = pd.to_numeric(raw["Credit"].replace("", "0"), errors="coerce")
+        amount = credit.where(credit != 0.0, -debit)
+    elif ap["amount"] == "Transaction Amount":  # For account id 1
+        amount = pd.to_numeric(raw[ap["amount"]], errors="coerce")
+        amount = amount.where(transaction_type == "Credit", -amount)
+    else:
+        amount = pd.to_numeric(raw[ap["amount"]].str.replace(",", ".").str.replace(" ", ""), errors="coerce")
+        if transaction_type is not None:  # For account id 4
+            is_exchange = transaction_type.isin(["EXCHANGE", "TOPUP"])
+            fee = pd.to_numeric(raw["Fee"].where(is_exchange, "0"), errors="coerce")
+            keep = ~is_exchange | (fee != 0.0)
+            amount = amount.where(~is_exchange, fee)
+    data["amount_account_currency"] = amount
+
+    invalid = keep & (data["date"].isna() | data["amount_account_currency"].isna())
+    warnings = [f"Error parsing row: {row} in file: {file_name}." for row in raw[invalid].to_dict("records")]
+    data = data[keep & ~invalid].assign(
+        account_currency=ap["currencyCode"] if ap["currencyCode"] not in [""] else raw["Currency"],
+        bank_name=account["bankName"],
+        account=account["accountType"].replace(" ", "_"),
+        origin_file_name=file_name,
+        account_id=account_id,
+    )
+    return data[STATEMENT_COLUMNS].reset_index(drop=True), warnings
+
+
+def add_fingerprints(data: pd.DataFrame, occurrences: Optional[Dict[str, Dict[str, int]]] = None) -> pd.DataFrame:
+    """Fingerprint every transaction, identical rows of one file are numbered so they stay distinct.
+
+    :param occurrences: Per file, how many times each transaction was already read from it, keyed by its first
+        fingerprint. The numbering continues from these counts, which are updated with the rows of data.
+    """
+    accounts = data["account"].map(get_account_value)
+    key_columns = [data["date"], data["bank_name"], accounts, data["amount_account_currency"], data["description"]]
+    keys = list(zip(*key_columns))
+    if occurrences is None:
+        numbers = data.groupby([data["origin_file_name"], *key_columns], sort=False).cumcount()
+    else:
+        numbers = []
+        for file_name, key in zip(data["origin_file_name"], keys):
+            counts = occurrences.setdefault(file_name, {})
+            first_fingerprint = make_fingerprint(*key)
+            numbers.append(counts.get(first_fingerprint, 0))
+            counts[first_fingerprint] = numbers[-1] + 1
+    fingerprints = [make_fingerprint(*key, number) for key, number in zip(keys, numbers)]
+    return data.assign(fingerprint=fingerprints)
+
+
+def add_amount_usd(data: pd.DataFrame) -> pd.DataFrame:
+    """Convert the amounts of a statement frame to USD at the rate of each transaction date."""
+    days = data["date"].dt.date
+    rate_store = ExchangeRateStore.get_instance()
+    rate_rows = []
+    for bank, group in data.groupby("bank_name"):
+        pairs = set(zip(group["account_currency"], days[group.index]))
+        for (currency, day), rate in rate_store.resolve(pairs, is_test=bank).items():
+            rate_rows.append((bank, currency, day, rate))
+
+    rates = pd.DataFrame(rate_rows, columns=["bank_name", "account_currency", "day", "rate"])
+    rate = data[["bank_name", "account_currency"]].assign(day=days).merge(rates, how="left")["rate"]
+    return data.assign(amount_usd=(data["amount_account_currency"] / rate.values).round(2))
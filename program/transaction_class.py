@@ -1,17 +1,19 @@
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TypeVar, List, Optional
+from typing import TypeVar, List, Optional, TYPE_CHECKING
 
-import pandas as pd
+from program.constants import Account, Tags, TagSource
 
-from program.constants import Account, Tags
+if TYPE_CHECKING:
+    import pandas as pd
 
 T = TypeVar("T")
 
 # date,bank,account,amount_account_currency,tag,description,amount_usd,account_currency
 
 
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     _instance = None
     account: Account
@@ -24,8 +26,16 @@ class Transaction:
     description: str
     origin_file_name: str
     tag: Optional[Tags] = None
+    fingerprint: Optional[str] = field(default=None, repr=False, compare=False)
+    confidence: Optional[float] = field(default=None, compare=False)  # Model probability of the tag, None for other sources
+    tag_source: Optional[TagSource] = field(default=None, compare=False)
+    flagged: bool = field(default=False, repr=False, compare=False)  # Matched a keyword rule that asks for review
 
     def __post_init__(self):
+        # Few distinct values repeat on every row, interning makes all rows share one string object
+        self.account_currency = sys.intern(self.account_currency)
+        self.bank_name = sys.intern(self.bank_name)
+        self.origin_file_name = sys.intern(self.origin_file_name)
         if isinstance(self.account, str):
             try:
                 self.account = Account[self.account.upper()]  # Convert to uppercase for case-insensitive matching
@@ -46,7 +56,9 @@ class Transaction:
         }
 
     @staticmethod
-    def to_dataframe(transactions: List["Transaction"]) -> pd.DataFrame:
+    def to_dataframe(transactions: List["Transaction"]) -> "pd.DataFrame":
         """Convert a list of Transaction objects into a Pandas DataFrame"""
+        import pandas as pd
+
         return pd.DataFrame([t.to_dict() for t in transactions])
 
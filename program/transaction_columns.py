@@ -0,0 +1,271 @@
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Union, TYPE_CHECKING
+
+import numpy as np
+
+from program.constants import Account, Tags, TagSource
+from program.transaction_class import Transaction
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ACCOUNTS = list(Account)
+TAG_SOURCES = list(TagSource)
+NO_TAG = -1
+NO_TAG_SOURCE = -1
+CODED_FIELDS = ["account_currency", "bank_name", "origin_file_name"]
+
+
+def encode(values) -> tuple:
+    """Categorical codes and categories of an array of low-cardinality strings."""
+    categories, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.astype(np.int32), [str(category) for category in categories]
+
+
+class TransactionView:
+    """Row of a TransactionColumns with the attributes of a Transaction, reads and writes go to the columns."""
+
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns: "TransactionColumns", index: int):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def account(self) -> Account:
+        return ACCOUNTS[self._columns.account[self._index]]
+
+    @property
+    def account_id(self) -> int:
+        return int(self._columns.account_id[self._index])
+
+    @property
+    def account_currency(self) -> str:
+        return self._columns.get_coded("account_currency", self._index)
+
+    @property
+    def amount_account_currency(self) -> float:
+        return float(self._columns.amount_account_currency[self._index])
+
+    @property
+    def amount_usd(self) -> float:
+        return float(self._columns.amount_usd[self._index])
+
+    @property
+    def bank_name(self) -> str:
+        return self._columns.get_coded("bank_name", self._index)
+
+    @property
+    def date(self) -> datetime:
+        return self._columns.date[self._index].astype("datetime64[us]").item()
+
+    @property
+    def description(self) -> str:
+        return self._columns.description[self._index]
+
+    @description.setter
+    def description(self, value: str) -> None:
+        self._columns.description[self._index] = value
+
+    @property
+    def origin_file_name(self) -> str:
+        return self._columns.get_coded("origin_file_name", self._index)
+
+    @property
+    def tag(self) -> Optional[Tags]:
+        code = self._columns.tag[self._index]
+        return None if code == NO_TAG else Tags(int(code))
+
+    @tag.setter
+    def tag(self, value: Optional[Tags]) -> None:
+        self._columns.tag[self._index] = NO_TAG if value is None else value.value
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        return self._columns.fingerprint[self._index]
+
+    @property
+    def confidence(self) -> Optional[float]:
+        confidence = self._columns.confidence[self._index]
+        return None if np.isnan(confidence) else float(confidence)
+
+    @confidence.setter
+    def confidence(self, value: Optional[float]) -> None:
+        self._columns.confidence[self._index] = np.nan if value is None else value
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self._columns.flagged[self._index])
+
+    @flagged.setter
+    def flagged(self, value: bool) -> None:
+        self._columns.flagged[self._index] = value
+
+    @property
+    def tag_source(self) -> Optional[TagSource]:
+        code = self._columns.tag_source[self._index]
+        return None if code == NO_TAG_SOURCE else TAG_SOURCES[code]
+
+    @tag_source.setter
+    def tag_source(self, value: Optional[TagSource]) -> None:
+        self._columns.tag_source[self._index] = NO_TAG_SOURCE if value is None else TAG_SOURCES.index(value)
+
+    def to_dict(self) -> dict:
+        """Same dictionary as Transaction.to_dict"""
+        return {
+            "account": self.account.name,
+            "account_currency": self.account_currency,
+            "amount_account_currency": self.amount_account_currency,
+            "amount_usd": self.amount_usd,
+            "bank_name": self.bank_name,
+            "date": self.date,
+            "description": self.description,
+            "tag": self.tag.name if self.tag else None,
+        }
+
+    def to_transaction(self) -> Transaction:
+        """Copy the row into a standalone Transaction."""
+        return Transaction(
+            account=self.account,
+            account_id=self.account_id,
+            account_currency=self.account_currency,
+            amount_account_currency=self.amount_account_currency,
+            amount_usd=self.amount_usd,
+            bank_name=self.bank_name,
+            date=self.date,
+            description=self.description,
+            origin_file_name=self.origin_file_name,
+            tag=self.tag,
+            fingerprint=self.fingerprint,
+            confidence=self.confidence,
+            tag_source=self.tag_source,
+            flagged=self.flagged,
+        )
+
+
+class TransactionColumns:
+    """Transactions stored as one NumPy array per field instead of one object per row.
+
+    Dates are datetime64, amounts float64, account and tag are enum codes and the other low-cardinality strings
+    are categorical codes. Indexing gives TransactionView rows, so it can stand in for a list of transactions.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], categories: Dict[str, List[str]]):
+        self._set_arrays(arrays, categories)
+
+    def _set_arrays(self, arrays: Dict[str, np.ndarray], categories: Dict[str, List[str]]) -> None:
+        self.account = arrays["account"]
+        self.account_id = arrays["account_id"]
+        self.amount_account_currency = arrays["amount_account_currency"]
+        self.amount_usd = arrays["amount_usd"]
+        self.date = arrays["date"]
+        self.description = arrays["description"]
+        self.tag = arrays["tag"]
+        self.fingerprint = arrays["fingerprint"]
+        self.confidence = arrays["confidence"]
+        self.tag_source = arrays["tag_source"]
+        self.flagged = arrays["flagged"]
+        self.codes = {name: arrays[name] for name in CODED_FIELDS}
+        self.categories = categories
+
+    @classmethod
+    def from_frame(cls, data: "pd.DataFrame") -> "TransactionColumns":
+        """Build the columns from an imported statement frame."""
+        account_codes = data["account"].str.upper().map({account.name: code for code, account in enumerate(ACCOUNTS)})
+        if account_codes.isna().any():
+            raise ValueError(f"No matching enum value for account: {data['account'][account_codes.isna()].iloc[0]}")
+        arrays = {
+            "account": account_codes.to_numpy(np.int8),
+            "account_id": data["account_id"].to_numpy(np.int64),
+            "amount_account_currency": data["amount_account_currency"].to_numpy(np.float64),
+            "amount_usd": data["amount_usd"].to_numpy(np.float64),
+            "date": data["date"].to_numpy("datetime64[ns]"),
+            "description": data["description"].to_numpy(object),
+            "tag": np.full(len(data), NO_TAG, dtype=np.int16),
+            "fingerprint": data["fingerprint"].to_numpy(object) if "fingerprint" in data else np.full(len(data), None),
+            "confidence": np.full(len(data), np.nan, dtype=np.float32),
+            "tag_source": np.full(len(data), NO_TAG_SOURCE, dtype=np.int8),
+            "flagged": np.zeros(len(data), dtype=bool),
+        }
+        categories = {}
+        for name in CODED_FIELDS:
+            arrays[name], categories[name] = encode(data[name])
+        return cls(arrays, categories)
+
+    @classmethod
+    def from_transactions(cls, transactions: List[Transaction]) -> "TransactionColumns":
+        """Build the columns from Transaction objects."""
+        arrays = {
+            "account": np.array([ACCOUNTS.index(t.account) for t in transactions], dtype=np.int8),
+            "account_id": np.array([t.account_id for t in transactions], dtype=np.int64),
+            "amount_account_currency": np.array([t.amount_account_currency for t in transactions], dtype=np.float64),
+            "amount_usd": np.array([t.amount_usd for t in transactions], dtype=np.float64),
+            "date": np.array([t.date for t in transactions], dtype="datetime64[ns]"),
+            "description": np.array([t.description for t in transactions], dtype=object),
+            "tag": np.array([NO_TAG if t.tag is None else t.tag.value for t in transactions], dtype=np.int16),
+            "fingerprint": np.array([t.fingerprint for t in transactions], dtype=object),
+            "confidence": np.array([np.nan if t.confidence is None else t.confidence for t in transactions], dtype=np.float32),
+            "tag_source": np.array(
+                [NO_TAG_SOURCE if t.tag_source is None else TAG_SOURCES.index(t.tag_source) for t in transactions], dtype=np.int8
+            ),
+            "flagged": np.array([t.flagged for t in transactions], dtype=bool),
+        }
+        categories = {}
+        for name in CODED_FIELDS:
+            arrays[name], categories[name] = encode([getattr(t, name) for t in transactions])
+        return cls(arrays, categories)
+
+    def get_coded(self, name: str, index: int) -> str:
+        return self.categories[name][self.codes[name][index]]
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[TransactionView, List[TransactionView]]:
+        if isinstance(index, slice):
+            return [TransactionView(self, i) for i in range(*index.indices(len(self)))]
+        if index < -len(self) or index >= len(self):
+            raise IndexError("transaction index out of range")
+        return TransactionView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[TransactionView]:
+        return (TransactionView(self, i) for i in range(len(self)))
+
+    def extend(self, other: "TransactionColumns") -> None:
+        """Append the rows of other in place, like list.extend.
+
+        The arrays are replaced by longer ones, so views keep working but DataFrames from an earlier to_dataframe
+        still share the old arrays and no longer see edits.
+        """
+        arrays = {
+            name: np.concatenate([getattr(self, name), getattr(other, name)])
+            for name in ["account", "account_id", "amount_account_currency", "amount_usd", "date", "description", "tag", "fingerprint", "confidence", "tag_source", "flagged"]
+        }
+        categories = {}
+        for name in CODED_FIELDS:
+            values = np.concatenate(
+                [np.asarray(self.categories[name], dtype=object)[self.codes[name]], np.asarray(other.categories[name], dtype=object)[other.codes[name]]]
+            )
+            arrays[name], categories[name] = encode(values)
+        self._set_arrays(arrays, categories)
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """Wrap the arrays in a DataFrame with the columns of Transaction.to_dataframe, without copying them."""
+        import pandas as pd
+
+        def categorical(name: str) -> pd.Categorical:
+            return pd.Categorical.from_codes(self.codes[name], categories=self.categories[name])
+
+        return pd.DataFrame(
+            {
+                "account": pd.Categorical.from_codes(self.account, categories=[a.name for a in ACCOUNTS]),
+                "account_currency": categorical("account_currency"),
+                "amount_account_currency": self.amount_account_currency,
+                "amount_usd": self.amount_usd,
+                "bank_name": categorical("bank_name"),
+                "date": self.date,
+                "description": self.description,
+                "tag": pd.Categorical.from_codes(self.tag, categories=[t.name for t in Tags]),
+            },
+            copy=False,
+        )
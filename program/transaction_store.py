@@ -0,0 +1,193 @@
+import sqlite3
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Set
+
+from program.constants import Tags, TagSource
+from program.transaction_class import Transaction
+
+SQLITE_MAX_VARIABLES = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT UNIQUE,
+    date TEXT NOT NULL,
+    account TEXT NOT NULL,
+    account_id INTEGER NOT NULL,
+    account_currency TEXT NOT NULL,
+    amount_account_currency REAL NOT NULL,
+    amount_usd REAL NOT NULL,
+    bank_name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    origin_file_name TEXT NOT NULL,
+    tag TEXT,
+    is_processed INTEGER NOT NULL DEFAULT 0,
+    confidence REAL,
+    tag_source TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_tag_date ON transactions (tag, date);
+CREATE INDEX IF NOT EXISTS transactions_account_id_date ON transactions (account_id, date);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(description, content='transactions', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', old.id, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+END;
+"""
+
+COLUMNS = [
+    "fingerprint",
+    "date",
+    "account",
+    "account_id",
+    "account_currency",
+    "amount_account_currency",
+    "amount_usd",
+    "bank_name",
+    "description",
+    "origin_file_name",
+    "tag",
+    "confidence",
+    "tag_source",
+    "is_processed",
+]
+
+
+class TransactionStore:
+    """Embedded sqlite store of transactions with indexes on date, tag and account and a full-text description index."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:  # sqlite built without FTS5, search falls back to LIKE
+            self.has_fts = False
+
+    def _migrate(self) -> None:
+        """Add the columns introduced after a store was created."""
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(transactions)")}
+        for column, column_type in [("confidence", "REAL"), ("tag_source", "TEXT")]:
+            if column not in existing:
+                with self.connection:
+                    self.connection.execute(f"ALTER TABLE transactions ADD COLUMN {column} {column_type}")
+
+    def upsert(self, transactions: Iterable[Transaction], is_processed: bool = False) -> None:
+        """Write transactions in a single database transaction, known fingerprints get their tag and description updated."""
+        rows = [
+            (
+                t.fingerprint,
+                t.date.strftime("%Y-%m-%d"),
+                t.account.name,
+                t.account_id,
+                t.account_currency,
+                t.amount_account_currency,
+                t.amount_usd,
+                t.bank_name,
+                t.description,
+                t.origin_file_name,
+                t.tag.name if t.tag else None,
+                t.confidence,
+                t.tag_source.value if t.tag_source else None,
+                int(is_processed),
+            )
+            for t in transactions
+        ]
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO transactions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET "
+                "tag = excluded.tag, description = excluded.description, confidence = excluded.confidence, "
+                "tag_source = excluded.tag_source, is_processed = MAX(is_processed, excluded.is_processed)",
+                rows,
+            )
+
+    def get_processed(self, fingerprints: List[str]) -> Set[str]:
+        """Get the fingerprints of transactions that already went through insert_data_to_file."""
+        found = set()
+        for start in range(0, len(fingerprints), SQLITE_MAX_VARIABLES):
+            chunk = fingerprints[start:start + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"SELECT fingerprint FROM transactions WHERE is_processed = 1 AND fingerprint IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update(fingerprint for (fingerprint,) in rows)
+        return found
+
+    def query(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        tag: Optional[Tags] = None,
+        account_id: Optional[int] = None,
+        currency: Optional[str] = None,
+        text: Optional[str] = None,
+    ) -> List[Transaction]:
+        """
+        Get the transactions matching all given filters, sorted by date.
+
+        :param start: First day to include.
+        :param end: Last day to include.
+        :param tag: Only transactions with this tag.
+        :param account_id: Only transactions of this account.
+        :param currency: Only transactions in this account currency.
+        :param text: Text the description contains, searched as a full-text phrase.
+        """
+        conditions, parameters = [], []
+        if start is not None:
+            conditions.append("t.date >= ?")
+            parameters.append(start.isoformat())
+        if end is not None:
+            conditions.append("t.date <= ?")
+            parameters.append(end.isoformat())
+        if tag is not None:
+            conditions.append("t.tag = ?")
+            parameters.append(tag.name)
+        if account_id is not None:
+            conditions.append("t.account_id = ?")
+            parameters.append(account_id)
+        if currency is not None:
+            conditions.append("t.account_currency = ?")
+            parameters.append(currency)
+        if text is not None and self.has_fts:
+            conditions.append("t.id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)")
+            parameters.append('"' + text.replace('"', '""') + '"')  # a phrase, punctuation is not query syntax
+        elif text is not None:
+            conditions.append("t.description LIKE ?")
+            parameters.append(f"%{text}%")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = ", ".join(f"t.{column}" for column in COLUMNS[:-1])
+        rows = self.connection.execute(f"SELECT {columns} FROM transactions t {where} ORDER BY t.date, t.id", parameters)
+        return [self._to_transaction(row) for row in rows]
+
+    @staticmethod
+    def _to_transaction(row: tuple) -> Transaction:
+        values = dict(zip(COLUMNS, row))
+        return Transaction(
+            account=values["account"],
+            account_id=values["account_id"],
+            account_currency=values["account_currency"],
+            amount_account_currency=values["amount_account_currency"],
+            amount_usd=values["amount_usd"],
+            bank_name=values["bank_name"],
+            date=datetime.strptime(values["date"], "%Y-%m-%d"),
+            description=values["description"],
+            origin_file_name=values["origin_file_name"],
+            tag=Tags[values["tag"]] if values["tag"] else None,
+            fingerprint=values["fingerprint"],
+            confidence=values["confidence"],
+            tag_source=TagSource(values["tag_source"]) if values["tag_source"] else None,
+        )
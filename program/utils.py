@@ -1,20 +1,21 @@
 import csv
 import os
+import shutil
 import sys
-from datetime import datetime
-from typing import List
+import tempfile
+from typing import List, Optional
 
-import requests
+from program.exchange_rate_class import ExchangeRateStore
 
-from program.constants import CONFIG
+COLUMN_ALIASES = {"bank_name": "bank"}  # Older budget.csv files name the bank column "bank"
 
 
 def get_file_names(directory: str = "./data") -> List[str]:
-    """Get names of files located in the first-level directory."""
-    file_names = [
+    """Get sorted names of files located in the first-level directory."""
+    file_names = sorted(
         file for file in os.listdir(directory)
         if os.path.isfile(os.path.join(directory, file)) and file.endswith(".csv")
-    ]
+    )
     # Remove "budget.csv" if present
     if "budget.csv" in file_names:
         file_names.remove("budget.csv")
@@ -60,51 +61,92 @@ def show_paged_transactions(transactions: list, current_page=0) -> int:
         return current_page + 1
 
 
-def check_for_duplicate_column_names(file_name, csv_reader: csv.DictReader) -> None:
+def check_for_duplicate_column_names(file_name: str, column_names: List[str]) -> None:
     """Check for duplicate column names in the CSV file."""
-    column_names = csv_reader.fieldnames
     duplicates = [column for column in set(column_names) if column_names.count(column) > 1]
     if duplicates:
         raise ValueError(f"Duplicate column names found: {duplicates} in file: {file_name}")
 
 
-def get_exchange_rate(currency: str = "CZK", is_test: str = "Test Bank") -> float:
-    """Check if the currency is in the exchange_usd_rate_history.log file and is not older than x days."""
-    if currency == "USD":
-        return 1.0
+def append_rows_to_file(file_path: str, rows: List[list], columns: List[str]) -> None:
+    """Append csv rows with one buffered write to a temporary copy that atomically replaces the file.
 
-    days = 180 if is_test == "Test Bank" else 1
+    Rows hold the values of columns and are written in the order of the file's header, a column can also match its
+    older name of COLUMN_ALIASES. Columns missing from the header are added to its end, older rows leave them empty.
+    A new or empty file gets columns as its header.
+    The file keeps its permissions, a new file gets the default ones instead of those of the temporary file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", suffix=".tmp")
+    os.close(fd)
     try:
-        with open("exchange_usd_rate_history.log", "r") as file:
-            csv_reader = csv.reader(file)
-            for row in csv_reader:
-                if row[1] == currency:
-                    date = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-                    if (datetime.now() - date).days < days:
-                        return float(row[2])
-    except FileNotFoundError:
-        pass  # File does not exist, we will create it later
-
-    # If the exchange rate is not found or is too old, fetch it from the API
-    url = f"https://v6.exchangerate-api.com/v6/{CONFIG.exchangeRateApiKey}/latest/USD"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        exchange_rates = data.get("conversion_rates", {})
-        rate = exchange_rates.get(currency)
-        if rate is None:
-            raise ValueError(f"Exchange rate for currency {currency} not found.")
-
-        # Append new data to the file
-        with open("exchange_usd_rate_history.log", "a", newline="") as file:
-            csv_writer = csv.writer(file)
-            csv_writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), currency, rate])
-
-        return float(rate)
-    else:
-        raise ValueError(f"Error: Unable to fetch data (status code: {response.status_code})")
+        header = []
+        if os.path.isfile(file_path):
+            shutil.copy2(file_path, temp_path)
+            header = read_header(file_path)
+        else:
+            os.chmod(temp_path, get_default_file_mode())
+        if header:
+            missing = [column for column in columns if get_column_name(column, header) is None]
+            add_header_columns(file_path, temp_path, missing)
+            header += missing
+        positions = [header.index(get_column_name(column, header)) for column in columns] if header else None
+        with open(temp_path, "a", newline="") as file:
+            writer = csv.writer(file)
+            if not header:
+                writer.writerow(columns)
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    ordered = [""] * len(header)
+                    for position, value in zip(positions, row):
+                        ordered[position] = value
+                    writer.writerow(ordered)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def get_default_file_mode() -> int:
+    """Mode that open() gives a new file under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def read_header(file_path: str) -> List[str]:
+    """Column names of a csv file, empty for an empty file."""
+    with open(file_path, "r", newline="", encoding="UTF-8", errors="replace") as file:
+        return next(csv.reader(file), [])
+
+
+def get_column_name(column: str, header: List[str]) -> Optional[str]:
+    """Name under which a column appears in a header, its own or an older alias, None if it is missing."""
+    for name in [column, COLUMN_ALIASES.get(column)]:
+        if name in header:
+            return name
+    return None
+
+
+def add_header_columns(file_path: str, temp_path: str, columns: List[str]) -> None:
+    """Rewrite the copy of a csv file with the missing columns added to its header."""
+    with open(file_path, "r", newline="") as source:
+        header = source.readline()
+        names = header.rstrip("\r\n")
+        missing = [column for column in columns if column not in names.split(",")]
+        if not names or not missing:
+            return
+        with open(temp_path, "w", newline="") as target:
+            target.write(",".join([names] + missing) + header[len(names):])
+            shutil.copyfileobj(source, target)
 
 
+def get_exchange_rate(currency: str = "CZK", is_test: str = "Test Bank") -> float:
+    """Get today's rate of the currency from the exchange rate store, fetching it if it is missing."""
+    return ExchangeRateStore.get_instance().get_rate(currency, is_test=is_test)
+
 
 def signal_handler(sig, frame):
     print("\nCtrl+C detected. Cleaning up...")
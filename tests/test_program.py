@@ -4,13 +4,36 @@ from program.collection_class import Collection
 
 os.environ["ENV"] = ".env_test.json"
 
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+import stat
+import subprocess
 import sys
+import time
+
+import numpy as np
 import pytest
-from datetime import datetime
-from program.constants import CONFIG
-from program.utils import get_exchange_rate
+from datetime import datetime, date
+from ai.embedding_cache import EmbeddingCache
+from ai.text_encoders import HashingEncoder
+from program.constants import Config, get_config, Tags, TagSource
+from program.exchange_rate_class import ExchangeRateStore
+from program.helper_functions import check_description
+from program.keyword_rules import KeywordMatcher, KeywordRule
+from program.merchant_table import MerchantTable
+from program.parquet_ledger import ParquetLedger
+from program.transaction_class import Transaction
+from program.transaction_store import TransactionStore
+from program.utils import append_rows_to_file, get_default_file_mode, get_exchange_rate
 
 WORK_DIR = "./data/testing"
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous budgets, about ten times the times measured on a laptop, they catch the ML stack or pandas coming back
+# into the import path without failing on a slower machine
+MAIN_IMPORT_BUDGET_SECONDS = 1.0
+TEST_COLLECTION_BUDGET_SECONDS = 6.0
 
 
 # Fixture for setup tasks before each test method
@@ -48,6 +71,84 @@ class TestClass:
             assert t.amount_account_currency == amount
             assert t.description == data[4]
 
+    def test_import_parallel(self, setup_function):
+        """Test that importing files in a process pool keeps the order of a sequential import."""
+        with open(f"{WORK_DIR}/test_2.csv", "w") as file:
+            file.write("Account Number,Transaction Date,Transaction Amount,Transaction Type,Transaction Description,Balance\n")
+            file.write("1234,09/01/23,7.50,Debit,second file,92.50\n")
+        try:
+            sequential, parallel = Collection(), Collection()
+            sequential.import_data(WORK_DIR)
+            parallel.import_data(WORK_DIR, workers=2)
+        finally:
+            os.remove(f"{WORK_DIR}/test_2.csv")
+        assert [t.to_dict() for t in parallel.transactions] == [t.to_dict() for t in sequential.transactions]
+        assert parallel.transactions[-1].description == "second file"
+
+    def test_parse_statement_sign_rules(self, tmp_path, monkeypatch, capsys):
+        """Test that the amounts of every account type match the row by row parser."""
+        from program.statement_reader import get_account_id, parse_statement, read_statement
+
+        orm = {
+            "description": "Description", "secondDescription": "Date", "thirdDescription": "Date",
+            "fourthDescription": "Date", "date": "Date", "dateFormat": "%Y-%m-%d", "delimiter": ",", "currencyCode": "EUR",
+        }
+        accounts = [
+            {"keyword": "transaction", "ormInformation": {**orm, "amount": "Transaction Amount", "transactionType": "Type"}},
+            {"keyword": "creditdebit", "ormInformation": {**orm, "amount": "Credit/Debit"}},
+            {"keyword": "fees", "ormInformation": {**orm, "amount": "Amount", "transactionType": "Type", "currencyCode": ""}},
+            {"keyword": "plain", "ormInformation": {**orm, "amount": "Amount"}},
+        ]
+        accounts = [{**account, "id": n, "bankName": "Bank", "accountType": "Checking"} for n, account in enumerate(accounts)]
+        monkeypatch.setattr("program.statement_reader.get_config", lambda: Config({"accounts": accounts}))
+        statements = {
+            "transaction.csv": "Date,Description,Transaction Amount,Type\n"
+            "2023-08-01,pay,10.00,Credit\n2023-08-02,shop,5.25,Debit\n",
+            "creditdebit.csv": "Date,Description,Credit,Debit\n"
+            "2023-08-01,refund,12.50,\n2023-08-02,rent,,800\n2023-08-03,nothing,,\n",
+            "fees.csv": "Date,Description,Amount,Type,Fee,Currency\n"
+            "2023-08-01,card,\"-1 234,50\",CARD_PAYMENT,0,CHF\n2023-08-02,free exchange,100,EXCHANGE,0,CHF\n"
+            "2023-08-03,paid exchange,100,EXCHANGE,-1.5,CHF\n2023-08-04,topup,50,TOPUP,-0.25,EUR\n",
+            "plain.csv": "Date,Description,Amount\n2023-08-01,coffee,\"-3,20\"\n2023-08-02,salary,2000\n",
+        }
+
+        def parse_row_by_row(file_name):
+            """The amounts as the row by row parser computed them, skipped rows are left out."""
+            ap = accounts[get_account_id(file_name)]["ormInformation"]
+            amounts = []
+            with open(tmp_path / file_name) as file:
+                for row in csv.DictReader(file, delimiter=ap["delimiter"]):
+                    if ap["amount"] == "Credit/Debit":
+                        debit = float(row["Debit"]) if row["Debit"] else 0.0
+                        credit = float(row["Credit"]) if row["Credit"] else 0.0
+                        amount = credit if credit != 0.0 else -debit
+                    elif ap["amount"] == "Transaction Amount":
+                        amount = float(row[ap["amount"]])
+                        amount = amount if row[ap["transactionType"]] == "Credit" else -amount
+                    elif ap.get("transactionType") and row[ap["transactionType"]] in ["EXCHANGE", "TOPUP"]:
+                        if float(row["Fee"]) == 0:
+                            continue
+                        amount = float(row["Fee"])
+                    else:
+                        amount = float(row[ap["amount"]].replace(",", ".").replace(" ", ""))
+                    amounts.append(amount)
+            return amounts
+
+        for file_name, content in statements.items():
+            (tmp_path / file_name).write_text(content)
+            data, warnings = parse_statement(str(tmp_path), file_name)
+            assert data["amount_account_currency"].tolist() == parse_row_by_row(file_name), file_name
+            assert warnings == []
+        assert parse_statement(str(tmp_path), "fees.csv")[0]["account_currency"].tolist() == ["CHF", "CHF", "EUR"]
+
+        # Rows whose date or amount does not parse, e.g. a total line, are reported and skipped
+        (tmp_path / "plain.csv").write_text("Date,Description,Amount\n2023-08-01,coffee,3.20\n2023-13-01,typo,1\nTotal,,three\n")
+        data, warnings = parse_statement(str(tmp_path), "plain.csv")
+        assert data["description"].tolist() == ["coffee"]
+        assert len(warnings) == 2 and "typo" in warnings[0] and "Total" in warnings[1]
+        assert read_statement(str(tmp_path), "plain.csv")["description"].tolist() == ["coffee"]
+        assert "WARNING: Error parsing row:" in capsys.readouterr().out
+
     def test_format_data(self, setup_function, monkeypatch):
         # Define an input value
         input_value = "m"  # stands for 'misc' tag
@@ -89,6 +190,8 @@ class TestClass:
         sys.stdout = open(os.devnull, "w")
         # Use monkeypatch.setattr to replace the input() function
         # with a function that returns values from the input_sequence
+        # Queue every model tag, so the review items are the imported transactions in order
+        monkeypatch.setattr("program.collection_class.get_auto_accept_threshold", lambda: 1.1)
         collection = Collection()
         collection.import_data(WORK_DIR)
         collection.format_and_tag_data()
@@ -98,13 +201,523 @@ class TestClass:
         with pytest.raises(IndexError):
             var = collection.transactions[2].tag.name
 
+    def test_merchant_table(self, tmp_path):
+        """Test that pure, frequent merchants of the rows the program wrote to budget.csv are tagged without the model."""
+        shutil.copy(f"{WORK_DIR}/budget.csv", tmp_path / "budget.csv")
+        ledgered = Collection()
+        for day, description, tag in [
+            (1, "NETFLIX.COM 1", Tags.utilities),
+            (2, "NETFLIX.COM 2", Tags.utilities),
+            (3, "NETFLIX.COM 3", Tags.utilities),
+            (4, "SHOP", Tags.food),
+            (5, "SHOP", Tags.misc),
+        ]:
+            ledgered.transactions.append(
+                Transaction("Savings", 0, "EUR", -5.0, -5.5, "Test Bank", datetime(2023, 8, day), description, "test.csv", tag=tag)
+            )
+        ledgered.insert_data_to_file(str(tmp_path))
+        table = MerchantTable.from_ledger(str(tmp_path / "budget.csv"), min_count=2)
+        assert table.tags == {"NETFLIX COM": (Tags.utilities, 1.0)}
+
+        collection = Collection(merchant_table=table)
+        collection.transactions.append(
+            Transaction("Savings", 0, "EUR", -5.0, -5.5, "Test Bank", datetime(2023, 9, 1), "NETFLIX.COM 42", "test.csv")
+        )
+        collection.format_and_tag_data()
+        assert collection.transactions[0].tag == Tags.utilities
+        assert table.lookup("SHOP") is None
+        assert table.hit_rate == 0.5
+
+    def test_format_and_review_pipelined(self):
+        """Test that chunks tagged in the background are reviewed in order."""
+        table = MerchantTable({"NETFLIX COM": (Tags.utilities, 1.0)})
+        collection = Collection(merchant_table=table)
+        for day in range(1, 4):
+            collection.transactions.append(
+                Transaction("Savings", 0, "EUR", -5.0, -5.5, "Test Bank", datetime(2023, 9, day), "NETFLIX.COM", "test.csv")
+            )
+        chunks = list(collection.tag_in_background(chunk_size=2))
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        collection.format_and_review_pipelined(chunk_size=2)
+        assert [t.tag for t in collection.transactions] == [Tags.utilities] * 3
+
+    def test_tag_in_background_is_quiet(self, monkeypatch):
+        """Test that the background tagger asks the model not to print while the caller prompts for reviews."""
+        calls = []
+
+        def predict_tags(transactions, verbose=True):
+            calls.append(verbose)
+            for t in transactions:
+                t.tag, t.tag_source, t.confidence = Tags.misc, TagSource.model, 0.5
+
+        collection = Collection(merchant_table=MerchantTable({}))
+        monkeypatch.setattr(collection, "predict_tags", predict_tags)
+        collection.transactions.append(
+            Transaction("Savings", 0, "EUR", -5.0, -5.5, "Test Bank", datetime(2023, 9, 1), "UNKNOWN SHOP", "test.csv")
+        )
+        assert [len(chunk) for chunk in collection.tag_in_background()] == [1]
+        assert calls == [False]
+
+    def test_review_queue(self, setup_function, monkeypatch):
+        """Test that only unconfident, untagged or description-less transactions are queued for review."""
+        collection = Collection()
+        collection.import_data(WORK_DIR, skip_ledgered=False)
+        confident, unconfident = collection.transactions
+        confident.tag, confident.tag_source, confident.confidence = Tags.misc, TagSource.model, 0.99
+        unconfident.tag, unconfident.tag_source, unconfident.confidence = Tags.out, TagSource.model, 0.5
+        assert collection.get_review_queue(threshold=0.9) == [unconfident]
+        unconfident.tag_source, unconfident.confidence = TagSource.merchant_table, None
+        assert collection.get_review_queue(threshold=0.9) == []
+        confident.description = ""
+        assert collection.get_review_queue(threshold=0.9) == [confident]
+
+        # Keyword rules that ask for a description flag the transaction for review whatever the model confidence
+        monkeypatch.setattr("builtins.input", lambda _: "dinner")
+        confident.tag, confident.tag_source, confident.confidence = Tags.food, TagSource.model, 0.97
+        confident.description = "PAYMENT VENMO 123"
+        check_description(confident)
+        assert confident.description == "VENMO: dinner"
+        assert collection.get_review_queue(threshold=0.95) == [confident]
+
+    def test_review_data_queue(self, setup_function, monkeypatch):
+        """Test that confidently tagged transactions are not offered for review and untagged ones can be edited."""
+        inputs = iter(["0", "f", "", "y", "q"])
+        monkeypatch.setattr("builtins.input", lambda _: next(inputs))
+        collection = Collection()
+        collection.import_data(WORK_DIR, skip_ledgered=False)
+        accepted, untagged = collection.transactions
+        accepted.tag, accepted.tag_source, accepted.confidence = Tags.misc, TagSource.model, 0.99
+        collection.review_data()
+        assert (accepted.tag, accepted.tag_source) == (Tags.misc, TagSource.model)
+        assert (untagged.tag, untagged.tag_source, untagged.confidence) == (Tags.food, TagSource.user, None)
+
+    def test_insert_data_to_file(self, tmp_path):
+        """Test that tagged transactions are appended to budget.csv sorted by date, in the order of its header."""
+        shutil.copy(f"{WORK_DIR}/budget.csv", tmp_path / "budget.csv")
+        collection = Collection()
+        for day, tag, tag_source, confidence in [
+            (25, Tags.food, TagSource.model, 0.98),
+            (15, Tags.misc, TagSource.rule, None),
+            (20, None, None, None),
+        ]:
+            collection.transactions.append(
+                Transaction(
+                    account="Savings",
+                    account_id=0,
+                    account_currency="EUR",
+                    amount_account_currency=-5.0,
+                    amount_usd=-5.5,
+                    bank_name="Test Bank",
+                    date=datetime(2023, 8, day),
+                    description=f"item {day}",
+                    origin_file_name="test.csv",
+                    tag=tag,
+                    confidence=confidence,
+                    tag_source=tag_source,
+                )
+            )
+        collection.insert_data_to_file(str(tmp_path))
+        lines = (tmp_path / "budget.csv").read_text().splitlines()
+        assert lines == [
+            "date,bank_name,account,amount_account_currency,tag,description,amount_usd,account_currency,confidence,tag_source",
+            "2023-08-15,Test Bank,Savings,-5.0,misc,item 15,-5.5,EUR,,rule",
+            "2023-08-25,Test Bank,Savings,-5.0,food,item 25,-5.5,EUR,0.98,model",
+        ]
+        assert os.listdir(tmp_path) == ["budget.csv"]
+
+    def test_append_rows_to_file_mode(self, tmp_path):
+        """Test that appending keeps the mode of the file and gives a new file the umask default."""
+        new_file, existing_file = tmp_path / "new.csv", tmp_path / "existing.csv"
+        append_rows_to_file(str(new_file), [["1", "2"]], ["a", "b"])
+        assert stat.S_IMODE(os.stat(new_file).st_mode) == get_default_file_mode()
+        assert new_file.read_text().splitlines() == ["a,b", "1,2"]
+        existing_file.write_text("a,b\n")
+        os.chmod(existing_file, 0o640)
+        append_rows_to_file(str(existing_file), [["c", "d"]], ["a", "b"])
+        assert stat.S_IMODE(os.stat(existing_file).st_mode) == 0o640
+        assert existing_file.read_text().splitlines() == ["a,b", "c,d"]
+
+    def test_append_rows_to_file_header_order(self, tmp_path):
+        """Test that rows are written in the order of the existing header, under old column names, new columns last."""
+        path = tmp_path / "budget.csv"
+        path.write_text("date,bank,tag,description,amount\r\n2023-08-01,Old Bank,food,old,1.0\r\n")
+        columns = ["date", "bank_name", "amount", "description", "tag", "confidence"]
+        append_rows_to_file(str(path), [["2023-08-02", "New Bank", 2.0, "new", "misc", 0.5]], columns)
+        assert path.read_text().splitlines() == [
+            "date,bank,tag,description,amount,confidence",
+            "2023-08-01,Old Bank,food,old,1.0",
+            "2023-08-02,New Bank,misc,new,2.0,0.5",
+        ]
+
+    def test_import_skips_ledgered(self, setup_function, tmp_path):
+        """Test that transactions inserted into budget.csv are not imported again."""
+        shutil.copy(f"{WORK_DIR}/test.csv", tmp_path / "test.csv")
+        shutil.copy(f"{WORK_DIR}/budget.csv", tmp_path / "budget.csv")
+        collection = Collection()
+        collection.import_data(str(tmp_path))
+        assert len(collection.transactions) == 2
+        collection.transactions[0].tag = Tags.food
+        collection.transactions[0].description = "edited in review"
+        collection.insert_data_to_file(str(tmp_path))
+
+        collection = Collection()
+        collection.import_data(str(tmp_path))
+        assert collection.transactions == []
+
+    def test_import_skips_ledgered_rows(self, setup_function, tmp_path):
+        """Test that the rows appended to budget.csv are recognized without the fingerprint sidecar."""
+        shutil.copy(f"{WORK_DIR}/test.csv", tmp_path / "test.csv")
+        shutil.copy(f"{WORK_DIR}/budget.csv", tmp_path / "budget.csv")
+        collection = Collection()
+        collection.import_data(str(tmp_path))
+        for t in collection.transactions:
+            t.tag = Tags.misc
+        collection.insert_data_to_file(str(tmp_path))
+        os.remove(tmp_path / "budget.csv.fingerprints")
+
+        collection = Collection()
+        collection.import_data(str(tmp_path))
+        assert collection.transactions == []
+
+    def test_import_columnar(self, setup_function):
+        """Test that the columnar collection matches the object one and edits show in its DataFrame view."""
+        collection = Collection()
+        collection.import_data(WORK_DIR, skip_ledgered=False)
+        columnar = Collection(columnar=True)
+        assert columnar.to_dataframe().empty
+        columnar.import_data(WORK_DIR, skip_ledgered=False)
+        assert [t.to_dict() for t in columnar.transactions] == [t.to_dict() for t in collection.transactions]
+
+        columnar.transactions[0].tag = Tags.food
+        data = columnar.to_dataframe()
+        assert data["tag"][0] == "food"
+        assert np.shares_memory(data["amount_usd"].to_numpy(), columnar.transactions.amount_usd)
+
+        first = columnar.transactions[0]
+        columnar.import_data(WORK_DIR, skip_ledgered=False)
+        first.tag = Tags.misc
+        assert len(columnar.transactions) == 4
+        assert [t.tag for t in columnar.transactions] == [Tags.misc, None, None, None]
+
+    def test_import_incremental(self, setup_function, tmp_path):
+        """Test that unchanged files are skipped and only the appended rows of a grown file are read."""
+        shutil.copy(f"{WORK_DIR}/test.csv", tmp_path / "test.csv")
+        collection = Collection()
+        collection.import_data(str(tmp_path), skip_ledgered=False, incremental=True)
+        assert len(collection.transactions) == 2
+        collection.insert_data_to_file(str(tmp_path))
+
+        collection = Collection()
+        collection.import_data(str(tmp_path), skip_ledgered=False, incremental=True)
+        assert collection.transactions == []
+
+        with open(tmp_path / "test.csv", "a") as file:
+            file.write("1234,08/30/23,3.00,Debit,appended,97.00\n")
+        collection = Collection()
+        collection.import_data(str(tmp_path), skip_ledgered=False, incremental=True)
+        assert [t.description for t in collection.transactions] == ["appended"]
+        assert collection.import_manifest.pending["test.csv"]["last_date"] == "2023-08-30"
+        collection.insert_data_to_file(str(tmp_path))
+
+        with open(tmp_path / "test.csv", "a") as file:
+            file.write(setup_function[0])
+        collection = Collection()
+        collection.import_data(str(tmp_path), incremental=True)
+        assert [t.description for t in collection.transactions] == ["test"]
+
+    def test_parquet_ledger(self, tmp_path):
+        """Test that the parquet ledger reads back pruned columns of recent partitions and exports csv."""
+        pytest.importorskip("pyarrow")
+        ledger = ParquetLedger(str(tmp_path / "budget_parquet"))
+        ledger.append(
+            [
+                ["2023-08-15", "Test Bank", "Savings", -5.0, "EUR", -5.5, "food", "old"],
+                ["2024-02-01", "Test Bank", "Savings", -2.0, "EUR", -2.2, "misc", "new"],
+            ]
+        )
+        data = ledger.read(columns=["date", "description", "amount_usd", "tag"], since=date(2024, 1, 1))
+        assert list(data.columns) == ["date", "description", "amount_usd", "tag"]
+        assert data["description"].tolist() == ["new"]
+
+        ledger.export_csv(str(tmp_path / "budget.csv"))
+        lines = (tmp_path / "budget.csv").read_text().splitlines()
+        assert lines[0] == "date,bank_name,account,amount_account_currency,account_currency,amount_usd,tag,description,confidence,tag_source"
+        assert lines[1] == "2023-08-15,Test Bank,Savings,-5.0,EUR,-5.5,food,old,,"
+
+    def test_parquet_ledger_from_csv(self, tmp_path):
+        """Test that a budget.csv, also one with the older bank column, migrates to the parquet ledger."""
+        pytest.importorskip("pyarrow")
+        (tmp_path / "budget.csv").write_text(
+            "date,bank,account,amount_account_currency,tag,description,amount_usd,account_currency\r\n"
+            "2023-08-15,Test Bank,Savings,-5.0,food,old,-5.5,EUR\r\n"
+            "2024-02-01,Test Bank,Savings,-2.0,misc,new,-2.2,EUR\r\n"
+        )
+        ledger = ParquetLedger.from_csv(str(tmp_path / "budget.csv"), str(tmp_path / "budget_parquet"))
+        data = ledger.read(columns=["date", "bank_name", "tag", "description", "amount_usd"])
+        assert data["bank_name"].tolist() == ["Test Bank", "Test Bank"]
+        assert data["tag"].tolist() == ["food", "misc"]
+        assert data["amount_usd"].tolist() == [-5.5, -2.2]
+
+    def test_transaction_store(self, setup_function, tmp_path):
+        """Test that imported and inserted transactions are queryable and marked as processed in the store."""
+        store = TransactionStore(str(tmp_path / "transactions.db"))
+        collection = Collection(transaction_store=store)
+        collection.import_data(WORK_DIR, skip_ledgered=False)
+        assert store.get_processed([t.fingerprint for t in collection.transactions]) == set()
+
+        collection.transactions[0].tag = Tags.food
+        shutil.copy(f"{WORK_DIR}/budget.csv", tmp_path / "budget.csv")
+        collection.insert_data_to_file(str(tmp_path))
+        assert store.get_processed([t.fingerprint for t in collection.transactions]) == {
+            t.fingerprint for t in collection.transactions
+        }
+        food = store.query(tag=Tags.food, currency="EUR", start=date(2023, 1, 1), end=date(2023, 12, 31))
+        assert [t.description for t in food] == ["test"]
+        assert [t.description for t in store.query(text="VENMO")] == ["VENMO"]
+
+    def test_transaction_store_text_query(self, tmp_path):
+        """Test that text with full-text query syntax in it is searched as plain text."""
+        store = TransactionStore(str(tmp_path / "transactions.db"))
+        descriptions = ["AMAZON.COM*1234", "7-ELEVEN 42", 'CAFE "LA RUE"', "GROCERIES"]
+        store.upsert(
+            [
+                Transaction(
+                    account="Savings",
+                    account_id=0,
+                    account_currency="EUR",
+                    amount_account_currency=-5.0,
+                    amount_usd=-5.5,
+                    bank_name="Test Bank",
+                    date=datetime(2023, 8, day),
+                    description=description,
+                    origin_file_name="test.csv",
+                )
+                for day, description in enumerate(descriptions, start=1)
+            ]
+        )
+        assert [t.description for t in store.query(text="AMAZON.COM")] == ["AMAZON.COM*1234"]
+        assert [t.description for t in store.query(text="7-ELEVEN")] == ["7-ELEVEN 42"]
+        assert [t.description for t in store.query(text='"LA RUE"')] == ['CAFE "LA RUE"']
+        assert store.query(text='"') == []
+
+    def test_keyword_matcher(self):
+        """Test that the first listed rule matching anywhere in a description wins."""
+        matcher = KeywordMatcher(
+            [KeywordRule("ATM ", tag=Tags.misc, description="cash"), KeywordRule("NETFLIX", tag=Tags.utilities), KeywordRule("FLIX", skip=True)]
+        )
+        assert matcher.match("NETFLIX.COM ATM 123").description == "cash"
+        assert matcher.match("NETFLIX.COM").tag == Tags.utilities
+        assert matcher.match("MOVIEFLIX").skip
+        assert matcher.match("GROCERIES") is None
+
+    @pytest.mark.parametrize(
+        "keywords",
+        [
+            ["ABC", "BCD"],  # overlapping
+            ["BCD", "ABC"],
+            ["FLIX", "NETFLIX"],  # suffix of another keyword
+            ["NETFLIX", "FLIX"],
+            ["NET", "NETFLIX", "ETF"],  # prefix and infix of another keyword
+            ["XYZ", "ABCD", "CD", "D"],
+        ],
+    )
+    def test_keyword_matcher_priority(self, keywords):
+        """Test that the matcher returns the first listed rule whose keyword is in the description, like a linear scan."""
+        rules = [KeywordRule(keyword, description=keyword) for keyword in keywords]
+        matcher = KeywordMatcher(rules)
+        for description in ["ABCD", "NETFLIX.COM", "MOVIEFLIX", "PAYNET", "ETF FUND", "XABCX", "D", "", "GROCERIES"]:
+            expected = next((rule for rule in rules if rule.keyword in description), None)
+            assert matcher.match(description) is expected, description
+
     def test_env_file(self):
         """Test that the .env.json file is set up correctly."""
-        assert isinstance(CONFIG.accounts[0]["bankName"], str)
+        assert isinstance(get_config().accounts[0]["bankName"], str)
 
     def test_get_exchange_rates(self):
         """Test that the exchange rates are fetched correctly."""
-        if CONFIG.exchangeRateApiKey != "":
-            currency_code = CONFIG.accounts[0]["ormInformation"]["currencyCode"]
+        if get_config().exchangeRateApiKey != "":
+            currency_code = get_config().accounts[0]["ormInformation"]["currencyCode"]
             assert currency_code == "EUR"
             assert isinstance(get_exchange_rate(currency_code), float)
+
+    def test_exchange_rate_store(self, tmp_path, monkeypatch):
+        """Test that rates are looked up by day and missing days are fetched once for all currencies."""
+        log_path = tmp_path / "rates.log"
+        log_path.write_text("2023-08-15 08:00:00,EUR,0.8\n2023-08-15 09:00:00,EUR,0.9\n")
+        calls = []
+
+        class MockResponse:
+            status_code = 200
+
+            def json(self):
+                return {"conversion_rates": {"EUR": 0.95, "CZK": 22.5}}
+
+        monkeypatch.setattr("requests.get", lambda url, timeout: calls.append(url) or MockResponse())
+        store = ExchangeRateStore(str(tmp_path / "rates.db"), str(log_path))
+        rates = store.resolve(
+            [("EUR", date(2023, 8, 15)), ("CZK", date(2023, 8, 25)), ("EUR", date(2023, 8, 25)), ("USD", date(2023, 8, 25))],
+            is_test="Bank",
+        )
+        assert rates[("EUR", date(2023, 8, 15))] == 0.9
+        assert rates[("EUR", date(2023, 8, 25))] == 0.95
+        assert rates[("CZK", date(2023, 8, 25))] == 22.5
+        assert rates[("USD", date(2023, 8, 25))] == 1.0
+        assert calls == [f"https://v6.exchangerate-api.com/v6/{get_config().exchangeRateApiKey}/history/USD/2023/8/25"]
+
+        # Days that cannot be fetched only fall back to rates a few days away
+        monkeypatch.setattr("requests.get", lambda url, timeout: type("Failed", (), {"status_code": 500})())
+        assert store.resolve([("EUR", date(2023, 8, 28))], is_test="Bank")[("EUR", date(2023, 8, 28))] == 0.95
+        with pytest.raises(ValueError):
+            store.resolve([("EUR", date(2023, 12, 1))], is_test="Bank")
+
+        # Each thread gets its own connection
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert list(executor.map(lambda day: store.lookup("EUR", day), [date(2023, 8, 15)] * 2)) == [0.9, 0.9]
+
+    def test_exchange_rate_prefetch_range(self, tmp_path, monkeypatch):
+        """Test that a range prefetch only fetches the days not stored yet for every currency."""
+        calls = []
+
+        class MockResponse:
+            status_code = 200
+
+            def json(self):
+                return {"conversion_rates": {"EUR": 0.95, "CZK": 22.5}}
+
+        monkeypatch.setattr("requests.get", lambda url, timeout: calls.append(url) or MockResponse())
+        store = ExchangeRateStore(str(tmp_path / "rates.db"), str(tmp_path / "rates.log"))
+        store._store({("EUR", date(2023, 8, 1)): 0.9, ("CZK", date(2023, 8, 1)): 22.0, ("EUR", date(2023, 8, 2)): 0.9})
+        store.prefetch_range(date(2023, 8, 1), date(2023, 8, 3), ["EUR", "CZK", "USD"])
+        api_url = f"https://v6.exchangerate-api.com/v6/{get_config().exchangeRateApiKey}/history/USD"
+        assert calls == [f"{api_url}/2023/8/2", f"{api_url}/2023/8/3"]
+        assert store.lookup("CZK", date(2023, 8, 1)) == 22.0
+        assert store.lookup("CZK", date(2023, 8, 2)) == 22.5
+
+        calls.clear()
+        store.prefetch_range(date(2023, 8, 1), date(2023, 8, 3), ["EUR", "CZK"])
+        store.prefetch_range(date(2023, 8, 1), date(2023, 8, 3), ["USD"])
+        assert calls == []
+
+    def test_embedding_cache(self, tmp_path):
+        """Test that cached embeddings round-trip and the key depends on the embedding settings."""
+        cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+        key = EmbeddingCache.make_key("bert-base-multilingual-cased", "cls", 128, "NETFLIX")
+        assert key != EmbeddingCache.make_key("bert-base-multilingual-cased", "mean", 128, "NETFLIX")
+        cache.put_many({key: np.arange(4, dtype=np.float32)})
+        found = cache.get_many([key, "missing"])
+        assert list(found.keys()) == [key]
+        assert found[key].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+    def test_load_embedding_manifest(self, tmp_path):
+        """Test that saved embeddings are only loaded for the descriptions they were computed from."""
+        pytest.importorskip("torch")
+        pytest.importorskip("transformers")
+        from ai.bert_embedding_model import BertEmbeddings, get_manifest_path
+
+        save_path = str(tmp_path / "embeddings.npy")
+        BertEmbeddings.save_embedding(np.eye(2, dtype=np.float32), save_path, ["NETFLIX", "GROCERIES"])
+        assert BertEmbeddings.load_embedding(save_path, ["NETFLIX", "GROCERIES"]).tolist() == [[1.0, 0.0], [0.0, 1.0]]
+        with pytest.raises(ValueError, match="rebuild them"):
+            BertEmbeddings.load_embedding(save_path, ["GROCERIES", "NETFLIX"])
+        os.remove(get_manifest_path(save_path))
+        assert BertEmbeddings.load_embedding(save_path).shape == (2, 2)
+        with pytest.raises(ValueError, match="rebuild them"):
+            BertEmbeddings.load_embedding(save_path, ["NETFLIX", "GROCERIES"])
+
+    def test_bert_embedding_batches(self):
+        """Test that length-sorted mini-batches give the embeddings of a single batch, in the order of the texts."""
+        torch = pytest.importorskip("torch")
+        pytest.importorskip("transformers")
+        from types import SimpleNamespace
+
+        from ai.bert_embedding_model import BertEmbeddings
+
+        class Batch(dict):
+            def to(self, device):
+                return self
+
+        class StubTokenizer:
+            """One token per character, the token id is the character code."""
+
+            def __call__(self, texts, truncation, max_length):
+                input_ids = [[ord(c) for c in text][:max_length] for text in texts]
+                return {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+
+            def pad(self, encoded, return_tensors):
+                length = max(len(ids) for ids in encoded["input_ids"])
+                return Batch({key: torch.tensor([v + [0] * (length - len(v)) for v in values]) for key, values in encoded.items()})
+
+        def stub_model(input_ids, attention_mask):
+            return SimpleNamespace(last_hidden_state=input_ids.float().unsqueeze(-1) * torch.tensor([1.0, -2.0]))
+
+        embedder = BertEmbeddings.__new__(BertEmbeddings)
+        embedder.tokenizer, embedder.model, embedder.embedding_dim = StubTokenizer(), stub_model, 2
+        embedder.max_length, embedder.device = 8, torch.device("cpu")
+        texts = ["hello world", "a", "xyz", "abcdef", "qq", "longest text of all"]
+        for pooling in ["mean", "cls"]:
+            batched = embedder.get_bert_embedding(texts, pooling, batch_size=2)
+            assert np.array_equal(batched, embedder.get_bert_embedding(texts, pooling, batch_size=len(texts)))
+            firsts = [np.mean([ord(c) for c in text[:8]]) if pooling == "mean" else ord(text[0]) for text in texts]
+            assert np.allclose(batched, np.outer(firsts, [1.0, -2.0]))
+
+    def test_hashing_encoder(self):
+        """Test that the hashing encoder gives fixed-size, normalized float32 vectors without loading a model."""
+        pytest.importorskip("sklearn")
+        encoder = HashingEncoder(n_features=64)
+        embeddings = encoder.encode(["NETFLIX.COM", "netflix.com", "GROCERIES"])
+        assert embeddings.shape == (3, encoder.embedding_dim) and embeddings.dtype == np.float32
+        assert np.allclose(embeddings[0], embeddings[1])
+        assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+
+    def test_predict_batches(self):
+        """Test that streamed predictions over chunks and uneven batches match a single predict call."""
+        torch = pytest.importorskip("torch")
+        from ai.neural_network_model import MultimodalModel, MultimodalTrainer
+
+        torch.manual_seed(0)
+        trainer = MultimodalTrainer(MultimodalModel(text_input_dim=8))
+        numeric, text = np.random.default_rng(0).normal(size=(2, 23, 8)).astype(np.float32)
+        numeric = numeric[:, :4]
+        expected = trainer.predict(numeric, text)
+        chunks = [(numeric[:10], text[:10]), (numeric[10:], text[10:])]
+        batches = list(trainer.predict_batches(chunks, batch_size=4))
+        assert [len(predictions) for predictions, _ in batches] == [4, 4, 2, 4, 4, 4, 1]
+        predictions = torch.cat([predictions for predictions, _ in batches])
+        probabilities = torch.cat([probabilities for _, probabilities in batches])
+        assert torch.equal(predictions, expected)
+        assert torch.allclose(probabilities.sum(dim=1), torch.ones(len(numeric)))
+        assert torch.equal(probabilities.argmax(dim=1), predictions)
+
+    def test_checkpoint_text_encoder(self, tmp_path):
+        """Test that a saved model loads with the text encoder and text input size it was trained with."""
+        pytest.importorskip("torch")
+        pytest.importorskip("transformers")
+        from ai.model_registry import ModelRegistry
+        from ai.neural_network_model import MultimodalModel, MultimodalTrainer
+
+        encoder = ModelRegistry.get_instance().get_encoder("hashing")
+        assert ModelRegistry.get_instance().get_encoder("hashing") is encoder
+        model_path = str(tmp_path / "saved_model.pth")
+        MultimodalTrainer(MultimodalModel(text_input_dim=encoder.embedding_dim), text_encoder="hashing").save(model_path)
+        trainer = MultimodalTrainer.load(MultimodalModel, model_path)
+        assert trainer.text_encoder == "hashing"
+        assert trainer.model.text_branch[0].in_features == encoder.embedding_dim
+
+    @pytest.mark.parametrize("module", ["main", "tests.test_program"])
+    def test_startup_time(self, module):
+        """Test that importing main.py or the tests stays within budget and does not load the ML stack or pandas."""
+        code = (
+            f"import json, sys, time; start = time.perf_counter(); import {module}; "
+            "print(json.dumps([time.perf_counter() - start, [m for m in ('torch', 'transformers', 'pandas') if m in sys.modules]]))"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+        import_time, heavy_modules = json.loads(result.stdout.strip().splitlines()[-1])
+        assert heavy_modules == []
+        if module == "main":
+            assert import_time < MAIN_IMPORT_BUDGET_SECONDS
+
+    def test_collection_time(self):
+        """Test that pytest collects the tests within budget, interpreter and pytest startup included."""
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "pytest", "--collect-only", "-q"], cwd=ROOT_DIR, capture_output=True, check=True)
+        assert time.perf_counter() - start < TEST_COLLECTION_BUDGET_SECONDS